@@ -1,22 +1,98 @@
 import base64
 import logging
 import os
+import threading
+import time
+from collections import OrderedDict
 
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from google.cloud import kms
 
+# How long a KMS-wrapped data key is reused for new messages
+DATA_KEY_TTL_SECONDS = 3600
+
+# How many unwrapped data keys are kept for decryption
+UNWRAPPED_KEY_CACHE_SIZE = 16
+
+# Associated data bound to every message ciphertext
+MESSAGE_AAD = b"message"
+
+# Length of the authentication tag AES-GCM appends to the ciphertext
+GCM_TAG_LENGTH = 16
+
 
 class MessageEncryption:
-    def __init__(self, project_id, location_id, key_ring_id, key_id):
+    def __init__(
+        self,
+        project_id,
+        location_id,
+        key_ring_id,
+        key_id,
+        data_key_ttl=DATA_KEY_TTL_SECONDS,
+    ):
         self.client = kms.KeyManagementServiceClient()
         self.key_name = f"projects/{project_id}/locations/{location_id}/keyRings/{key_ring_id}/cryptoKeys/{key_id}"
 
         # Generate a secure salt for PBKDF2
         self.salt = os.urandom(16)
 
+        # Envelope encryption: one data key (and one KMS call) per TTL window
+        # instead of per message, plus a small cache of unwrapped data keys
+        self._data_key_ttl = data_key_ttl
+        self._data_key = None
+        self._encrypted_data_key = None
+        self._data_key_expires_at = 0.0
+        self._unwrapped_keys = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_data_key(self):
+        """Return the current (data key, KMS-encrypted data key) pair.
+
+        A new data key is generated and wrapped with KMS when the current one
+        is older than the configured TTL.
+        """
+        with self._lock:
+            if self._data_key is None or time.monotonic() >= self._data_key_expires_at:
+                data_key = os.urandom(32)
+                encrypt_request = {
+                    "name": self.key_name,
+                    "plaintext": data_key,
+                }
+                encrypt_response = self.client.encrypt(request=encrypt_request)
+                self._data_key = data_key
+                self._encrypted_data_key = encrypt_response.ciphertext
+                self._data_key_expires_at = time.monotonic() + self._data_key_ttl
+                self._remember_unwrapped_key(self._encrypted_data_key, data_key)
+            return self._data_key, self._encrypted_data_key
+
+    def _remember_unwrapped_key(self, encrypted_data_key, data_key):
+        """Cache an unwrapped data key, evicting the least recently used."""
+        self._unwrapped_keys[encrypted_data_key] = data_key
+        self._unwrapped_keys.move_to_end(encrypted_data_key)
+        while len(self._unwrapped_keys) > UNWRAPPED_KEY_CACHE_SIZE:
+            self._unwrapped_keys.popitem(last=False)
+
+    def _unwrap_data_key(self, encrypted_data_key):
+        """Decrypt a data key with KMS, reusing recently unwrapped keys."""
+        with self._lock:
+            data_key = self._unwrapped_keys.get(encrypted_data_key)
+            if data_key is not None:
+                self._unwrapped_keys.move_to_end(encrypted_data_key)
+                return data_key
+
+        decrypt_request = {
+            "name": self.key_name,
+            "ciphertext": encrypted_data_key,
+        }
+        data_key = self.client.decrypt(request=decrypt_request).plaintext
+        with self._lock:
+            self._remember_unwrapped_key(encrypted_data_key, data_key)
+        return data_key
+
     def _derive_key(self, password):
         """Derive a key from the password using PBKDF2"""
         kdf = PBKDF2HMAC(
@@ -29,48 +105,41 @@ class MessageEncryption:
         return kdf.derive(password.encode())
 
     def encrypt_message(self, message):
-        """Encrypt a message using Google Cloud KMS"""
-        try:
-            # Generate a random data key
-            data_key = os.urandom(32)
-
-            # Encrypt the data key using KMS
-            encrypt_request = {
-                "name": self.key_name,
-                "plaintext": data_key,
-            }
-            encrypt_response = self.client.encrypt(request=encrypt_request)
-            encrypted_data_key = encrypt_response.ciphertext
+        """Encrypt a message with a KMS-wrapped data key"""
+        return self.encrypt_messages([message])[0]
 
-            # Generate a random IV
-            iv = os.urandom(12)
-
-            # Encrypt the message using AES-GCM
-            cipher = Cipher(
-                algorithms.AES(data_key),
-                modes.GCM(iv),
-                backend=default_backend(),
-            )
-            encryptor = cipher.encryptor()
-
-            # Add associated data (optional, for additional security)
-            encryptor.authenticate_additional_data(b"message")
-
-            # Encrypt the message
-            ciphertext = encryptor.update(message.encode()) + encryptor.finalize()
-
-            # Combine all components
-            encrypted_data = {
-                "encrypted_data_key": base64.b64encode(encrypted_data_key).decode(
-                    "utf-8"
-                ),
-                "iv": base64.b64encode(iv).decode("utf-8"),
-                "ciphertext": base64.b64encode(ciphertext).decode("utf-8"),
-                "tag": base64.b64encode(encryptor.tag).decode("utf-8"),
-                "salt": base64.b64encode(self.salt).decode("utf-8"),
-            }
-
-            return encrypted_data
+    def encrypt_messages(self, messages):
+        """Encrypt several messages with one data key and one cipher context"""
+        try:
+            # Get the current data key and its KMS-encrypted form
+            data_key, encrypted_data_key = self._get_data_key()
+            aesgcm = AESGCM(data_key)
+
+            # Components shared by every message in the batch
+            encoded_data_key = base64.b64encode(encrypted_data_key).decode("utf-8")
+            encoded_salt = base64.b64encode(self.salt).decode("utf-8")
+
+            encrypted_messages = []
+            for message in messages:
+                # Each message gets its own random IV
+                iv = os.urandom(12)
+
+                # AES-GCM returns the ciphertext with the tag appended
+                sealed = aesgcm.encrypt(iv, message.encode(), MESSAGE_AAD)
+                ciphertext = sealed[:-GCM_TAG_LENGTH]
+                tag = sealed[-GCM_TAG_LENGTH:]
+
+                encrypted_messages.append(
+                    {
+                        "encrypted_data_key": encoded_data_key,
+                        "iv": base64.b64encode(iv).decode("utf-8"),
+                        "ciphertext": base64.b64encode(ciphertext).decode("utf-8"),
+                        "tag": base64.b64encode(tag).decode("utf-8"),
+                        "salt": encoded_salt,
+                    }
+                )
+
+            return encrypted_messages
 
         except Exception as e:
             logging.exception(f"Encryption error: {e!s}")
@@ -85,13 +154,8 @@ class MessageEncryption:
             ciphertext = base64.b64decode(encrypted_data["ciphertext"])
             tag = base64.b64decode(encrypted_data["tag"])
 
-            # Decrypt the data key using KMS
-            decrypt_request = {
-                "name": self.key_name,
-                "ciphertext": encrypted_data_key,
-            }
-            decrypt_response = self.client.decrypt(request=decrypt_request)
-            data_key = decrypt_response.plaintext
+            # Decrypt the data key using KMS (or the unwrapped key cache)
+            data_key = self._unwrap_data_key(encrypted_data_key)
 
             # Decrypt the message using AES-GCM
             cipher = Cipher(
@@ -102,7 +166,7 @@ class MessageEncryption:
             decryptor = cipher.decryptor()
 
             # Add associated data (must match encryption)
-            decryptor.authenticate_additional_data(b"message")
+            decryptor.authenticate_additional_data(MESSAGE_AAD)
 
             # Decrypt the message
             plaintext = decryptor.update(ciphertext) + decryptor.finalize()
@@ -5,6 +5,8 @@ enabling clean separation between the application logic and external services.
 """
 
 from abc import ABC, abstractmethod
+from collections.abc import Iterator
+from dataclasses import dataclass
 from typing import Any, Protocol
 
 
@@ -26,6 +28,19 @@ class DatabaseDocument(Protocol):
         ...
 
 
+class DatabaseDocumentReference(Protocol):
+    """Protocol for references to a single database document."""
+
+    @property
+    def id(self) -> str:
+        """Document ID."""
+        ...
+
+    def get(self) -> DatabaseDocument:
+        """Fetch the current snapshot of the document."""
+        ...
+
+
 class DatabaseQuery(Protocol):
     """Protocol for database query objects."""
 
@@ -41,8 +56,8 @@ class DatabaseQuery(Protocol):
         """Start results after the given document."""
         ...
 
-    def stream(self) -> list[DatabaseDocument]:
-        """Execute query and return documents."""
+    def stream(self) -> Iterator[DatabaseDocument]:
+        """Execute query and yield documents as they arrive."""
         ...
 
 
@@ -53,8 +68,20 @@ class DatabaseCollection(Protocol):
         """Add a document to the collection."""
         ...
 
-    def document(self, doc_id: str) -> DatabaseDocument:
-        """Get a document reference."""
+    def batch_add(self, items: list[dict[str, Any]]) -> list[str]:
+        """Add several documents in batched writes and return their IDs."""
+        ...
+
+    async def add_async(self, data: dict[str, Any]) -> tuple:
+        """Add a document without blocking the event loop."""
+        ...
+
+    async def batch_add_async(self, items: list[dict[str, Any]]) -> list[str]:
+        """Batch-add documents without blocking the event loop."""
+        ...
+
+    def document(self, doc_id: str) -> DatabaseDocumentReference:
+        """Get a document reference without fetching it."""
         ...
 
     def where(self, filter: Any = None, **kwargs) -> DatabaseQuery:
@@ -65,7 +92,7 @@ class DatabaseCollection(Protocol):
         """Create a limited query."""
         ...
 
-    def stream(self) -> list[DatabaseDocument]:
+    def stream(self) -> Iterator[DatabaseDocument]:
         """Stream all documents."""
         ...
 
@@ -93,6 +120,10 @@ class EncryptionService(ABC):
     def encrypt_message(self, plaintext: str) -> dict[str, Any]:
         """Encrypt a message and return encrypted data."""
 
+    def encrypt_messages(self, plaintexts: list[str]) -> list[dict[str, Any]]:
+        """Encrypt several messages, in order."""
+        return [self.encrypt_message(plaintext) for plaintext in plaintexts]
+
     @abstractmethod
     def decrypt_message(self, encrypted_data: dict[str, Any]) -> str:
         """Decrypt a message from encrypted data."""
@@ -169,15 +200,26 @@ class TelegramUpdate(Protocol):
         ...
 
 
+@dataclass(slots=True, frozen=True)
+class SentMessageResult:
+    """Identifiers of a message the bot has sent."""
+
+    message_id: int
+    chat_id: int
+
+
 class TelegramBot(ABC):
     """Abstract Telegram bot interface."""
 
     @abstractmethod
     async def send_message(
         self, chat_id: int, text: str, parse_mode: str | None = None
-    ) -> dict[str, Any]:
+    ) -> SentMessageResult:
         """Send a message to a chat."""
 
+    async def warm_up(self) -> None:  # noqa: B027
+        """Open connections ahead of the first request (optional)."""
+
 
 class TelegramUpdateParser(ABC):
     """Abstract Telegram update parser interface."""
@@ -199,6 +241,8 @@ class MessageHandler(ABC):
 class ServiceContainer(ABC):
     """Abstract service container for dependency injection."""
 
+    __slots__ = ()
+
     @abstractmethod
     def get_database_client(self) -> DatabaseClient:
         """Get database client."""
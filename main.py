@@ -12,12 +12,18 @@ Key improvements:
 """
 
 import asyncio
+import concurrent.futures
+import functools
 import logging
 import os
+import threading
 
 from flask import Flask, abort, jsonify, request
 
-from src.core.service_container import initialize_service_container
+from src.core.service_container import (
+    get_service_container,
+    initialize_service_container,
+)
 
 # Set up logging
 logging.basicConfig(
@@ -25,17 +31,53 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Global service container (set during app creation)
-_service_container = None
 _batch_size = 500
 
+# Longest a request thread waits on the shared loop, well inside
+# gunicorn's 120s worker timeout, so one stalled coroutine fails its own
+# request instead of pinning the thread
+_ASYNC_TIMEOUT_SECONDS = 30.0
+
+_event_loop: asyncio.AbstractEventLoop | None = None
+_event_loop_lock = threading.Lock()
+
+
+def _get_event_loop() -> asyncio.AbstractEventLoop:
+    """Return the process-wide event loop, starting its thread on first use.
+
+    Async clients such as the Telegram bot's httpx pool bind their
+    connections to the loop that opened them, so every request runs on
+    this one loop to keep those connections reusable.
+    """
+    global _event_loop  # noqa: PLW0603
+    with _event_loop_lock:
+        if _event_loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=loop.run_forever, name="event-loop", daemon=True
+            ).start()
+            _event_loop = loop
+    return _event_loop
+
+
+def _run_async(coro, timeout=_ASYNC_TIMEOUT_SECONDS):
+    """Run a coroutine on the shared event loop and wait for its result.
+
+    Raises TimeoutError, after cancelling the coroutine, if it does not
+    finish within ``timeout`` seconds.
+    """
+    future = asyncio.run_coroutine_threadsafe(coro, _get_event_loop())
+    try:
+        return future.result(timeout=timeout)
+    except concurrent.futures.TimeoutError:
+        future.cancel()
+        raise
 
-def _get_service_container():
-    """Get the current service container."""
-    global _service_container  # noqa: PLW0602
-    if _service_container is None:
-        raise RuntimeError("Service container not initialized")
-    return _service_container
+
+def _warm_up_telegram_bot():
+    """Open the Telegram connection pool before the first webhook arrives."""
+    telegram_bot = get_service_container().get_telegram_bot()
+    asyncio.run_coroutine_threadsafe(telegram_bot.warm_up(), _get_event_loop())
 
 
 def _healthz():
@@ -57,7 +99,7 @@ def _webhook(secret):
         )
 
         # Get services from container (no conditional logic!)
-        service_container = _get_service_container()
+        service_container = get_service_container()
         message_handler = service_container.get_message_handler()
         update_parser = service_container.get_telegram_update_parser()
 
@@ -69,17 +111,9 @@ def _webhook(secret):
             logger.info("⏭️ Skipping non-message update")
             return jsonify({"status": "ok"})
 
-        # Process the message asynchronously
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            # Handle message using injected handler
-            loop.run_until_complete(message_handler.handle_message(update))
-            logger.info(
-                f"✅ Successfully processed message {update.message.message_id}"
-            )
-        finally:
-            loop.close()
+        # Handle message using injected handler on the shared event loop
+        _run_async(message_handler.handle_message(update))
+        logger.info(f"✅ Successfully processed message {update.message.message_id}")
 
         return jsonify({"status": "ok"})
 
@@ -138,7 +172,7 @@ def _get_messages():
     """Retrieve messages with optional filtering."""
     try:
         # Get services from container
-        service_container = _get_service_container()
+        service_container = get_service_container()
         db_client = service_container.get_database_client()
         encryption_service = service_container.get_encryption_service()
         field_filter_factory = service_container.get_field_filter_factory()
@@ -154,7 +188,9 @@ def _get_messages():
 
         # Add pagination
         if start_after:
-            start_after_doc = db_client.collection("messages").document(start_after)
+            start_after_doc = (
+                db_client.collection("messages").document(start_after).get()
+            )
             if start_after_doc.exists:
                 query = query.start_after(start_after_doc)
 
@@ -184,7 +220,7 @@ def _process_messages_batch():
     """Process messages in batch."""
     try:
         # Get services from container
-        service_container = _get_service_container()
+        service_container = get_service_container()
         db_client = service_container.get_database_client()
         encryption_service = service_container.get_encryption_service()
         field_filter_factory = service_container.get_field_filter_factory()
@@ -217,12 +253,12 @@ def _process_messages_batch():
 
 def create_app(environment: str | None = None) -> Flask:
     """Application factory that creates and configures the Flask app."""
-    global _service_container  # noqa: PLW0603
     app = Flask(__name__)
 
     # Initialize service container with dependency injection
     logger.info("🚀 Initializing TelegramGroupie application...")
-    _service_container = initialize_service_container(environment)
+    initialize_service_container(environment)
+    _warm_up_telegram_bot()
     logger.info("✅ TelegramGroupie application initialized successfully")
 
     # Register routes
@@ -246,13 +282,18 @@ def create_app(environment: str | None = None) -> Flask:
 
 
 # Only create app when running directly, not during imports
+@functools.cache
 def get_app():
-    """Get or create the Flask app instance."""
+    """Get or create the Flask app instance.
+
+    The app is built once per process and reused by later callers, so
+    repeated lookups do not re-initialize the service container.
+    """
     return create_app()
 
 
 if __name__ == "__main__":
     # When running directly, create app for the current environment
-    app = create_app()
+    app = get_app()
     port = int(os.environ.get("PORT", 8080))
     app.run(host="0.0.0.0", port=port)
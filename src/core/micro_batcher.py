@@ -0,0 +1,88 @@
+"""Coalesce concurrent async submissions into batched calls.
+
+Used to group the Firestore writes of webhooks that arrive together, so
+a burst of updates is committed in a few batched calls instead of one
+round trip per message.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from typing import TYPE_CHECKING, Generic, TypeVar
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable, Callable
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class MicroBatcher(Generic[T, R]):
+    """Group items submitted while a flush is in flight.
+
+    The first submission is flushed straight away, so an idle batcher adds
+    no latency. Items submitted while that flush runs are queued and sent
+    together in the next flush, up to ``max_batch`` items per call. Each
+    submitter awaits the result for its own item, and a failed flush
+    raises in every submitter of that batch. If the flush is cancelled,
+    every waiting submitter gets a RuntimeError instead of hanging.
+
+    A batcher must only be used from a single event loop.
+    """
+
+    def __init__(
+        self,
+        flush: Callable[[list[T]], Awaitable[list[R]]],
+        max_batch: int = 100,
+    ):
+        self._flush = flush
+        self._max_batch = max_batch
+        self._pending: list[tuple[T, asyncio.Future[R]]] = []
+        self._drainer: asyncio.Task[None] | None = None
+
+    async def submit(self, item: T) -> R:
+        """Queue an item and wait for the result of its flush."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if self._drainer is None:
+            self._drainer = loop.create_task(self._drain())
+        return await future
+
+    async def _drain(self) -> None:
+        try:
+            while self._pending:
+                batch = self._pending[: self._max_batch]
+                del self._pending[: self._max_batch]
+                await self._flush_batch(batch)
+        except BaseException:
+            # Cancelled: nobody is left to flush the queue, so release it
+            pending, self._pending = self._pending, []
+            self._fail(pending, _interrupted())
+            raise
+        finally:
+            self._drainer = None
+
+    async def _flush_batch(self, batch: list[tuple[T, asyncio.Future[R]]]) -> None:
+        try:
+            results = await self._flush([item for item, _ in batch])
+            for (_, future), result in zip(batch, results, strict=True):
+                if not future.done():
+                    future.set_result(result)
+        except Exception as e:
+            self._fail(batch, e)
+        except BaseException as e:
+            error = _interrupted()
+            error.__cause__ = e
+            self._fail(batch, error)
+            raise
+
+    @staticmethod
+    def _fail(batch: list[tuple[T, asyncio.Future[R]]], error: BaseException) -> None:
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+
+
+def _interrupted() -> RuntimeError:
+    return RuntimeError("Batch flush was interrupted before it completed")
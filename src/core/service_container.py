@@ -5,25 +5,55 @@ all the services needed by the application, using the appropriate
 implementations based on the environment.
 """
 
+from __future__ import annotations
+
+import functools
 import logging
 import os
+import threading
+from typing import TYPE_CHECKING
+
+from interfaces import ServiceContainer
+
+if TYPE_CHECKING:
+    from interfaces import (
+        DatabaseClient,
+        EncryptionService,
+        FieldFilterFactory,
+        MessageHandler,
+        TelegramBot,
+        TelegramUpdateParser,
+    )
 
-from interfaces import (
-    DatabaseClient,
-    EncryptionService,
-    FieldFilterFactory,
-    MessageHandler,
-    ServiceContainer,
-    TelegramBot,
-    TelegramUpdateParser,
+logger = logging.getLogger(__name__)
+
+# Environment variables that must be set (and non-empty) in production
+_REQUIRED_PRODUCTION_VARS = (
+    ("GCP_PROJECT_ID", "Google Cloud Project ID"),
+    ("TELEGRAM_TOKEN", "Telegram Bot Token"),
+    ("WEBHOOK_SECRET", "Webhook Secret"),
 )
 
-logger = logging.getLogger(__name__)
+
+def _env(name: str, default: str | None = None, _environ=os.environ) -> str | None:
+    """Read an environment variable, with os.environ bound as a local."""
+    return _environ.get(name, default)
 
 
 class ProductionServiceContainer(ServiceContainer):
     """Service container for production environment using real GCP services."""
 
+    __slots__ = (
+        "_db_client",
+        "_encryption_service",
+        "_field_filter_factory",
+        "_impl",
+        "_lock",
+        "_message_handler",
+        "_telegram_bot",
+        "_telegram_update_parser",
+    )
+
     def __init__(self):
         logger.info("🏭 Initializing production service container...")
         self._db_client: DatabaseClient | None = None
@@ -32,6 +62,10 @@ class ProductionServiceContainer(ServiceContainer):
         self._telegram_update_parser: TelegramUpdateParser | None = None
         self._field_filter_factory: FieldFilterFactory | None = None
         self._message_handler: MessageHandler | None = None
+        self._impl = None
+        # Request threads may ask for a service at the same time; one
+        # re-entrant lock ensures each service is built exactly once
+        self._lock = threading.RLock()
 
         # Validate required environment variables
         self._validate_environment()
@@ -39,16 +73,11 @@ class ProductionServiceContainer(ServiceContainer):
 
     def _validate_environment(self):
         """Validate that all required environment variables are set."""
-        required_vars = {
-            "GCP_PROJECT_ID": "Google Cloud Project ID",
-            "TELEGRAM_TOKEN": "Telegram Bot Token",
-            "WEBHOOK_SECRET": "Webhook Secret",
-        }
-
-        missing_vars = []
-        for var, description in required_vars.items():
-            if not os.environ.get(var):
-                missing_vars.append(f"{var} ({description})")
+        missing_vars = [
+            f"{var} ({description})"
+            for var, description in _REQUIRED_PRODUCTION_VARS
+            if not _env(var)
+        ]
 
         if missing_vars:
             msg = (
@@ -57,72 +86,100 @@ class ProductionServiceContainer(ServiceContainer):
             )
             raise ValueError(msg)
 
-    def get_database_client(self) -> DatabaseClient:
-        if self._db_client is None:
-            from src.implementations.production import ProductionDatabaseClient
+    def _implementations(self):
+        """Import the production implementations module on first use."""
+        if self._impl is None:
+            from src.implementations import production
+
+            self._impl = production
+        return self._impl
 
-            self._db_client = ProductionDatabaseClient()
-        return self._db_client
+    def get_database_client(self) -> DatabaseClient:
+        with self._lock:
+            if self._db_client is None:
+                impl = self._implementations()
+                pool_size = _env("FIRESTORE_CLIENT_POOL_SIZE", "4")
+                try:
+                    pool_size = int(pool_size)
+                except ValueError:
+                    msg = (
+                        "FIRESTORE_CLIENT_POOL_SIZE must be an integer, "
+                        f"got {pool_size!r}"
+                    )
+                    raise ValueError(msg) from None
+                self._db_client = impl.ProductionDatabaseClient(pool_size=pool_size)
+            return self._db_client
 
     def get_encryption_service(self) -> EncryptionService:
-        if self._encryption_service is None:
-            from src.implementations.production import ProductionEncryptionService
-
-            project_id = os.environ.get("GCP_PROJECT_ID")
-            kms_location = os.environ.get("KMS_LOCATION", "global")
-            kms_key_ring = os.environ.get("KMS_KEY_RING", "telegram-messages")
-            kms_key_id = os.environ.get("KMS_KEY_ID", "message-key")
-
-            self._encryption_service = ProductionEncryptionService(
-                project_id=project_id,
-                location_id=kms_location,
-                key_ring_id=kms_key_ring,
-                key_id=kms_key_id,
-            )
-        return self._encryption_service
+        with self._lock:
+            if self._encryption_service is None:
+                impl = self._implementations()
+                project_id = _env("GCP_PROJECT_ID")
+                kms_location = _env("KMS_LOCATION", "global")
+                kms_key_ring = _env("KMS_KEY_RING", "telegram-messages")
+                kms_key_id = _env("KMS_KEY_ID", "message-key")
+
+                self._encryption_service = impl.ProductionEncryptionService(
+                    project_id=project_id,
+                    location_id=kms_location,
+                    key_ring_id=kms_key_ring,
+                    key_id=kms_key_id,
+                )
+            return self._encryption_service
 
     def get_telegram_bot(self) -> TelegramBot:
-        if self._telegram_bot is None:
-            from src.implementations.production import ProductionTelegramBot
-
-            token = os.environ.get("TELEGRAM_TOKEN")
-            self._telegram_bot = ProductionTelegramBot(token)
-        return self._telegram_bot
+        with self._lock:
+            if self._telegram_bot is None:
+                impl = self._implementations()
+                token = _env("TELEGRAM_TOKEN")
+                self._telegram_bot = impl.ProductionTelegramBot(token)
+            return self._telegram_bot
 
     def get_telegram_update_parser(self) -> TelegramUpdateParser:
-        if self._telegram_update_parser is None:
-            from src.implementations.production import ProductionTelegramUpdateParser
-
-            # Reuse the same optimized bot instance from ProductionTelegramBot
-            # This ensures connection pool sharing between sending and parsing
-            telegram_bot = self.get_telegram_bot()
-            self._telegram_update_parser = ProductionTelegramUpdateParser(
-                telegram_bot._bot
-            )
-        return self._telegram_update_parser
+        with self._lock:
+            if self._telegram_update_parser is None:
+                impl = self._implementations()
+                # Reuse the same optimized bot instance from ProductionTelegramBot
+                # This ensures connection pool sharing between sending and parsing
+                telegram_bot = self.get_telegram_bot()
+                self._telegram_update_parser = impl.ProductionTelegramUpdateParser(
+                    telegram_bot._bot
+                )
+            return self._telegram_update_parser
 
     def get_field_filter_factory(self) -> FieldFilterFactory:
-        if self._field_filter_factory is None:
-            from src.implementations.production import ProductionFieldFilterFactory
-
-            self._field_filter_factory = ProductionFieldFilterFactory()
-        return self._field_filter_factory
+        with self._lock:
+            if self._field_filter_factory is None:
+                impl = self._implementations()
+                self._field_filter_factory = impl.ProductionFieldFilterFactory()
+            return self._field_filter_factory
 
     def get_message_handler(self) -> MessageHandler:
-        if self._message_handler is None:
-            from src.implementations.production import ProductionMessageHandler
-
-            self._message_handler = ProductionMessageHandler(
-                db_client=self.get_database_client(),
-                encryption_service=self.get_encryption_service(),
-                telegram_bot=self.get_telegram_bot(),
-            )
-        return self._message_handler
+        with self._lock:
+            if self._message_handler is None:
+                impl = self._implementations()
+                self._message_handler = impl.ProductionMessageHandler(
+                    db_client=self.get_database_client(),
+                    encryption_service=self.get_encryption_service(),
+                    telegram_bot=self.get_telegram_bot(),
+                )
+            return self._message_handler
 
 
 class TestServiceContainer(ServiceContainer):
     """Service container for test environment using mock implementations."""
 
+    __slots__ = (
+        "_db_client",
+        "_encryption_service",
+        "_field_filter_factory",
+        "_impl",
+        "_lock",
+        "_message_handler",
+        "_telegram_bot",
+        "_telegram_update_parser",
+    )
+
     def __init__(self):
         logger.info("🧪 Initializing test service container...")
         self._db_client: DatabaseClient | None = None
@@ -131,64 +188,102 @@ class TestServiceContainer(ServiceContainer):
         self._telegram_update_parser: TelegramUpdateParser | None = None
         self._field_filter_factory: FieldFilterFactory | None = None
         self._message_handler: MessageHandler | None = None
+        self._impl = None
+        # Request threads may ask for a service at the same time; one
+        # re-entrant lock ensures each service is built exactly once
+        self._lock = threading.RLock()
         logger.info("✅ Test service container initialized successfully")
 
-    def get_database_client(self) -> DatabaseClient:
-        if self._db_client is None:
-            from src.implementations.test import TestDatabaseClient
+    def _implementations(self):
+        """Import the test implementations module on first use."""
+        if self._impl is None:
+            from src.implementations import test
 
-            self._db_client = TestDatabaseClient()
-        return self._db_client
+            self._impl = test
+        return self._impl
+
+    def get_database_client(self) -> DatabaseClient:
+        with self._lock:
+            if self._db_client is None:
+                impl = self._implementations()
+                self._db_client = impl.TestDatabaseClient()
+            return self._db_client
 
     def get_encryption_service(self) -> EncryptionService:
-        if self._encryption_service is None:
-            from src.implementations.test import TestEncryptionService
-
-            project_id = os.environ.get("GCP_PROJECT_ID", "test-project")
-            kms_location = os.environ.get("KMS_LOCATION", "global")
-            kms_key_ring = os.environ.get("KMS_KEY_RING", "test-key-ring")
-            kms_key_id = os.environ.get("KMS_KEY_ID", "test-key")
-
-            self._encryption_service = TestEncryptionService(
-                project_id=project_id,
-                location_id=kms_location,
-                key_ring_id=kms_key_ring,
-                key_id=kms_key_id,
-            )
-        return self._encryption_service
+        with self._lock:
+            if self._encryption_service is None:
+                impl = self._implementations()
+                project_id = _env("GCP_PROJECT_ID", "test-project")
+                kms_location = _env("KMS_LOCATION", "global")
+                kms_key_ring = _env("KMS_KEY_RING", "test-key-ring")
+                kms_key_id = _env("KMS_KEY_ID", "test-key")
+
+                self._encryption_service = impl.TestEncryptionService(
+                    project_id=project_id,
+                    location_id=kms_location,
+                    key_ring_id=kms_key_ring,
+                    key_id=kms_key_id,
+                )
+            return self._encryption_service
 
     def get_telegram_bot(self) -> TelegramBot:
-        if self._telegram_bot is None:
-            from src.implementations.test import TestTelegramBot
-
-            token = os.environ.get("TELEGRAM_TOKEN", "test-token")
-            self._telegram_bot = TestTelegramBot(token)
-        return self._telegram_bot
+        with self._lock:
+            if self._telegram_bot is None:
+                impl = self._implementations()
+                token = _env("TELEGRAM_TOKEN", "test-token")
+                self._telegram_bot = impl.TestTelegramBot(token)
+            return self._telegram_bot
 
     def get_telegram_update_parser(self) -> TelegramUpdateParser:
-        if self._telegram_update_parser is None:
-            from src.implementations.test import TestTelegramUpdateParser
-
-            self._telegram_update_parser = TestTelegramUpdateParser()
-        return self._telegram_update_parser
+        with self._lock:
+            if self._telegram_update_parser is None:
+                impl = self._implementations()
+                self._telegram_update_parser = impl.TestTelegramUpdateParser()
+            return self._telegram_update_parser
 
     def get_field_filter_factory(self) -> FieldFilterFactory:
-        if self._field_filter_factory is None:
-            from src.implementations.test import TestFieldFilterFactory
-
-            self._field_filter_factory = TestFieldFilterFactory()
-        return self._field_filter_factory
+        with self._lock:
+            if self._field_filter_factory is None:
+                impl = self._implementations()
+                self._field_filter_factory = impl.TestFieldFilterFactory()
+            return self._field_filter_factory
 
     def get_message_handler(self) -> MessageHandler:
-        if self._message_handler is None:
-            from src.implementations.test import TestMessageHandler
-
-            self._message_handler = TestMessageHandler(
-                db_client=self.get_database_client(),
-                encryption_service=self.get_encryption_service(),
-                telegram_bot=self.get_telegram_bot(),
-            )
-        return self._message_handler
+        with self._lock:
+            if self._message_handler is None:
+                impl = self._implementations()
+                self._message_handler = impl.TestMessageHandler(
+                    db_client=self.get_database_client(),
+                    encryption_service=self.get_encryption_service(),
+                    telegram_bot=self.get_telegram_bot(),
+                )
+            return self._message_handler
+
+    def reset_state(self):
+        """Reset the in-memory data of services created so far.
+
+        Cheaper than rebuilding the container, for tests that share one app.
+        """
+        if self._db_client is not None:
+            self._db_client.reset()
+        if self._telegram_bot is not None:
+            self._telegram_bot.sent_messages.clear()
+
+
+@functools.cache
+def _detect_environment() -> str:
+    """Determine the environment from context.
+
+    The result is cached for the lifetime of the process; call
+    reset_service_container() to force a fresh detection.
+    """
+    if (
+        _env("FLASK_ENV") == "testing"
+        or _env("APP_ENV") == "test"
+        or "pytest" in _env("_", "")
+    ):
+        return "test"
+    return "production"
 
 
 def create_service_container(environment: str | None = None) -> ServiceContainer:
@@ -202,17 +297,9 @@ def create_service_container(environment: str | None = None) -> ServiceContainer
         The appropriate service container instance.
     """
     if environment is None:
-        # Determine environment from context
-        if (
-            os.environ.get("FLASK_ENV") == "testing"
-            or os.environ.get("APP_ENV") == "test"
-            or "pytest" in os.environ.get("_", "")
-        ):
-            environment = "test"
-        else:
-            environment = "production"
-
-    logger.info(f"🔧 Creating service container for environment: {environment}")
+        environment = _detect_environment()
+
+    logger.info("🔧 Creating service container for environment: %s", environment)
 
     if environment == "test":
         return TestServiceContainer()
@@ -224,6 +311,7 @@ def create_service_container(environment: str | None = None) -> ServiceContainer
 
 # Global service container instance (initialized by the application)
 _service_container: ServiceContainer | None = None
+_service_container_environment: str | None = None
 
 
 def get_service_container() -> ServiceContainer:
@@ -237,17 +325,27 @@ def get_service_container() -> ServiceContainer:
 
 
 def initialize_service_container(environment: str | None = None) -> ServiceContainer:
-    """Initialize the global service container."""
-    global _service_container  # noqa: PLW0603
+    """Initialize the global service container.
+
+    Initializing again for the environment that is already active returns
+    the existing container; call reset_service_container() first to force
+    a fresh one.
+    """
+    global _service_container, _service_container_environment  # noqa: PLW0603
+    if environment is None:
+        environment = _detect_environment()
+    if _service_container is not None and _service_container_environment == environment:
+        return _service_container
+
     _service_container = create_service_container(environment)
-    logger.info(
-        f"🚀 Service container initialized for "
-        f"{environment or 'auto-detected'} environment"
-    )
+    _service_container_environment = environment
+    logger.info("🚀 Service container initialized for %s environment", environment)
     return _service_container
 
 
 def reset_service_container():
     """Reset the global service container (useful for testing)."""
-    global _service_container  # noqa: PLW0603
+    global _service_container, _service_container_environment  # noqa: PLW0603
     _service_container = None
+    _service_container_environment = None
+    _detect_environment.cache_clear()
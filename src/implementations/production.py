@@ -4,10 +4,16 @@ This module provides the actual implementations that connect to
 Google Cloud Platform services for production use.
 """
 
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import functools
+import itertools
 import logging
-from datetime import datetime
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
+import httpx
 from google.cloud import firestore
 from google.cloud.firestore_v1.base_query import FieldFilter
 from telegram import Bot, Update
@@ -16,19 +22,50 @@ from telegram.request import HTTPXRequest
 from encryption import MessageEncryption
 from interfaces import (
     DatabaseClient,
-    DatabaseCollection,
-    DatabaseDocument,
-    DatabaseQuery,
     EncryptionService,
     FieldFilterFactory,
     MessageHandler,
+    SentMessageResult,
     TelegramBot,
-    TelegramUpdate,
     TelegramUpdateParser,
 )
+from src.core.micro_batcher import MicroBatcher
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+    from interfaces import (
+        DatabaseCollection,
+        DatabaseDocument,
+        DatabaseDocumentReference,
+        DatabaseQuery,
+        TelegramUpdate,
+    )
 
 logger = logging.getLogger(__name__)
 
+# Firestore's limit on writes in a single batch commit
+_WRITE_BATCH_LIMIT = 500
+
+# Threads for blocking Firestore calls made from async code
+_FIRESTORE_EXECUTOR_WORKERS = 40
+
+# Keep the whole Telegram pool open between bursts instead of letting
+# idle connections expire after httpx's default 5 seconds
+_TELEGRAM_POOL_SIZE = 20
+_TELEGRAM_KEEPALIVE_EXPIRY = 90.0
+
+# Bound once so the reply template is not re-parsed for every message
+_RESPONSE_TEMPLATE = (
+    "I received message from *{user}*, in the chat *{chat}*, message id #{mid}"
+).format
+
+# Upper bound on messages committed together by the write batcher
+_MAX_WRITE_BATCH = 100
+
+# Fixed display names by chat type; other chats are shown by title
+_CHAT_DISPLAY = {"private": "private chat"}
+
 
 class ProductionDatabaseDocument:
     """Production Firestore document wrapper."""
@@ -48,24 +85,38 @@ class ProductionDatabaseDocument:
         return self._firestore_doc.exists
 
 
+class ProductionDatabaseDocumentReference:
+    """Production Firestore document reference wrapper."""
+
+    def __init__(self, firestore_ref):
+        self._firestore_ref = firestore_ref
+
+    @property
+    def id(self) -> str:
+        return self._firestore_ref.id
+
+    def get(self) -> DatabaseDocument:
+        return ProductionDatabaseDocument(self._firestore_ref.get())
+
+
 class ProductionDatabaseQuery:
     """Production Firestore query wrapper."""
 
     def __init__(self, firestore_query):
         self._firestore_query = firestore_query
 
-    def where(self, filter: Any = None, **kwargs) -> "ProductionDatabaseQuery":
+    def where(self, filter: Any = None, **kwargs) -> ProductionDatabaseQuery:
         if filter is not None:
             query = self._firestore_query.where(filter=filter)
         else:
             query = self._firestore_query.where(**kwargs)
         return ProductionDatabaseQuery(query)
 
-    def limit(self, count: int) -> "ProductionDatabaseQuery":
+    def limit(self, count: int) -> ProductionDatabaseQuery:
         query = self._firestore_query.limit(count)
         return ProductionDatabaseQuery(query)
 
-    def start_after(self, document: DatabaseDocument) -> "ProductionDatabaseQuery":
+    def start_after(self, document: DatabaseDocument) -> ProductionDatabaseQuery:
         if hasattr(document, "_firestore_doc"):
             query = self._firestore_query.start_after(document._firestore_doc)
         else:
@@ -73,23 +124,58 @@ class ProductionDatabaseQuery:
             query = self._firestore_query.start_after(document)
         return ProductionDatabaseQuery(query)
 
-    def stream(self) -> list[DatabaseDocument]:
-        firestore_docs = self._firestore_query.stream()
-        return [ProductionDatabaseDocument(doc) for doc in firestore_docs]
+    def stream(self) -> Iterator[DatabaseDocument]:
+        return (
+            ProductionDatabaseDocument(doc) for doc in self._firestore_query.stream()
+        )
 
 
 class ProductionDatabaseCollection:
     """Production Firestore collection wrapper."""
 
-    def __init__(self, firestore_collection):
+    def __init__(self, firestore_collection, executor: concurrent.futures.Executor):
         self._firestore_collection = firestore_collection
+        self._executor = executor
 
     def add(self, data: dict[str, Any]) -> tuple:
         return self._firestore_collection.add(data)
 
-    def document(self, doc_id: str) -> DatabaseDocument:
-        firestore_doc = self._firestore_collection.document(doc_id).get()
-        return ProductionDatabaseDocument(firestore_doc)
+    async def add_async(self, data: dict[str, Any]) -> tuple:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.add, data)
+
+    def batch_add(self, items: list[dict[str, Any]]) -> list[str]:
+        """Write several documents and return their ids.
+
+        A single document is a plain add(); otherwise documents are
+        committed in WriteBatches of up to the per-commit limit.
+        """
+        if len(items) == 1:
+            _, doc_ref = self.add(items[0])
+            return [doc_ref.id]
+        doc_ids = []
+        for start in range(0, len(items), _WRITE_BATCH_LIMIT):
+            doc_ids += self._write_batch(items[start : start + _WRITE_BATCH_LIMIT])
+        return doc_ids
+
+    def _write_batch(self, items: list[dict[str, Any]]) -> list[str]:
+        """Commit documents together in one WriteBatch round trip."""
+        batch = self._firestore_collection._client.batch()
+        doc_ids = []
+        for data in items:
+            doc_ref = self._firestore_collection.document()
+            batch.set(doc_ref, data)
+            doc_ids.append(doc_ref.id)
+        batch.commit()
+        return doc_ids
+
+    async def batch_add_async(self, items: list[dict[str, Any]]) -> list[str]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.batch_add, items)
+
+    def document(self, doc_id: str) -> DatabaseDocumentReference:
+        firestore_ref = self._firestore_collection.document(doc_id)
+        return ProductionDatabaseDocumentReference(firestore_ref)
 
     def where(self, filter: Any = None, **kwargs) -> DatabaseQuery:
         if filter is not None:
@@ -102,29 +188,53 @@ class ProductionDatabaseCollection:
         query = self._firestore_collection.limit(count)
         return ProductionDatabaseQuery(query)
 
-    def stream(self) -> list[DatabaseDocument]:
-        firestore_docs = self._firestore_collection.stream()
-        return [ProductionDatabaseDocument(doc) for doc in firestore_docs]
+    def stream(self) -> Iterator[DatabaseDocument]:
+        return (
+            ProductionDatabaseDocument(doc)
+            for doc in self._firestore_collection.stream()
+        )
 
 
 class ProductionDatabaseClient(DatabaseClient):
     """Production Firestore client implementation."""
 
-    def __init__(self):
-        logger.info("🔥 Initializing production Firestore client...")
-        self._client = firestore.Client()
+    def __init__(self, pool_size: int = 4):
+        if pool_size < 1:
+            msg = f"Firestore client pool size must be at least 1, got {pool_size}"
+            raise ValueError(msg)
+        logger.info(
+            f"🔥 Initializing production Firestore client pool (size={pool_size})..."
+        )
+        # Each client owns its own gRPC channel; rotating through several
+        # keeps concurrent requests from queueing behind a single channel
+        self._clients = [firestore.Client() for _ in range(pool_size)]
+        self._next_client = itertools.cycle(self._clients)
+        # Shared by all collections so async callers never block the loop
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=_FIRESTORE_EXECUTOR_WORKERS, thread_name_prefix="firestore"
+        )
         logger.info("✅ Production Firestore client initialized successfully")
 
     def collection(self, collection_name: str) -> DatabaseCollection:
-        firestore_collection = self._client.collection(collection_name)
-        return ProductionDatabaseCollection(firestore_collection)
+        firestore_collection = next(self._next_client).collection(collection_name)
+        return ProductionDatabaseCollection(firestore_collection, self._executor)
+
+
+@functools.lru_cache(maxsize=256, typed=True)
+def _cached_field_filter(field: str, op: str, value: Any) -> FieldFilter:
+    """Build a FieldFilter, reusing instances for repeated hot filters."""
+    return FieldFilter(field, op, value)
 
 
 class ProductionFieldFilterFactory(FieldFilterFactory):
     """Production field filter factory using Firestore FieldFilter."""
 
     def create_filter(self, field: str, op: str, value: Any) -> Any:
-        return FieldFilter(field, op, value)
+        try:
+            return _cached_field_filter(field, op, value)
+        except TypeError:
+            # Unhashable values (e.g. lists for "in" filters) are not cached
+            return FieldFilter(field, op, value)
 
 
 class ProductionEncryptionService(EncryptionService):
@@ -149,6 +259,9 @@ class ProductionEncryptionService(EncryptionService):
     def encrypt_message(self, plaintext: str) -> dict[str, Any]:
         return self._encryption.encrypt_message(plaintext)
 
+    def encrypt_messages(self, plaintexts: list[str]) -> list[dict[str, Any]]:
+        return self._encryption.encrypt_messages(plaintexts)
+
     def decrypt_message(self, encrypted_data: dict[str, Any]) -> str:
         return self._encryption.decrypt_message(encrypted_data)
 
@@ -161,25 +274,46 @@ class ProductionTelegramBot(TelegramBot):
 
         # Configure HTTPXRequest with larger connection pool for production
         request = HTTPXRequest(
-            connection_pool_size=20,  # Increase from default 1 to handle concurrent requests
+            connection_pool_size=_TELEGRAM_POOL_SIZE,  # Increase from default 1 to handle concurrent requests
             connect_timeout=20.0,  # Increase connection timeout
             read_timeout=30.0,  # Increase read timeout
             pool_timeout=10.0,  # Increase pool timeout from default 1.0
             write_timeout=30.0,  # Increase write timeout
+            http_version="2",  # Multiplex concurrent sends over shared connections
+            httpx_kwargs={
+                "limits": httpx.Limits(
+                    max_connections=_TELEGRAM_POOL_SIZE,
+                    max_keepalive_connections=_TELEGRAM_POOL_SIZE,
+                    keepalive_expiry=_TELEGRAM_KEEPALIVE_EXPIRY,
+                )
+            },
         )
 
         self._bot = Bot(token=token, request=request)
+        # Queue sends beyond the pool size here rather than in httpx, where
+        # they would fail once pool_timeout expires
+        self._send_semaphore = asyncio.Semaphore(_TELEGRAM_POOL_SIZE)
         logger.info(
             "✅ Production Telegram bot initialized successfully with optimized connection pool"
         )
 
+    async def warm_up(self) -> None:
+        # initialize() issues getMe, completing the first TLS handshake
+        try:
+            await self._bot.initialize()
+        except Exception:
+            logger.warning("⚠️ Telegram bot warm-up failed", exc_info=True)
+        else:
+            logger.info("🔥 Telegram connection pool warmed up")
+
     async def send_message(
         self, chat_id: int, text: str, parse_mode: str | None = None
-    ) -> dict[str, Any]:
-        message = await self._bot.send_message(
-            chat_id=chat_id, text=text, parse_mode=parse_mode
-        )
-        return {"message_id": message.message_id, "chat": {"id": message.chat.id}}
+    ) -> SentMessageResult:
+        async with self._send_semaphore:
+            message = await self._bot.send_message(
+                chat_id=chat_id, text=text, parse_mode=parse_mode
+            )
+        return SentMessageResult(message_id=message.message_id, chat_id=message.chat.id)
 
 
 class ProductionTelegramUpdateParser(TelegramUpdateParser):
@@ -204,6 +338,30 @@ class ProductionMessageHandler(MessageHandler):
         self.db_client = db_client
         self.encryption_service = encryption_service
         self.telegram_bot = telegram_bot
+        self._write_batcher = MicroBatcher(
+            self._store_messages, max_batch=_MAX_WRITE_BATCH
+        )
+
+    async def _store_messages(
+        self, items: list[tuple[dict[str, Any], str]]
+    ) -> list[str]:
+        # One data key lookup and cipher context for the whole batch; kept
+        # off the loop since a key rotation calls KMS
+        encrypted_texts = await asyncio.to_thread(
+            self.encryption_service.encrypt_messages, [text for _, text in items]
+        )
+        documents = [
+            {**message_data, "encrypted_text": encrypted_text}
+            for (message_data, _), encrypted_text in zip(
+                items, encrypted_texts, strict=True
+            )
+        ]
+        messages_ref = self.db_client.collection("messages")
+        if len(documents) == 1:
+            # The usual case: a lone webhook needs no batch machinery
+            _, doc_ref = await messages_ref.add_async(documents[0])
+            return [doc_ref.id]
+        return await messages_ref.batch_add_async(documents)
 
     async def handle_message(self, update: TelegramUpdate) -> int | None:
         """Handle incoming Telegram message: store to Firestore and send response."""
@@ -217,10 +375,10 @@ class ProductionMessageHandler(MessageHandler):
             )
 
             # 1. Encrypt and store the message
+            pending = []
             if message.text:
-                encrypted_data = self.encryption_service.encrypt_message(message.text)
-
-                # Create message document
+                # Create message document; the text is encrypted with the
+                # rest of its write batch
                 message_data = {
                     "message_id": message.message_id,
                     "chat_id": chat.id,
@@ -228,40 +386,37 @@ class ProductionMessageHandler(MessageHandler):
                     "user_id": user.id,
                     "username": user.username,
                     "first_name": user.first_name,
-                    "encrypted_text": encrypted_data,
-                    "timestamp": datetime.utcnow(),
+                    "timestamp": firestore.SERVER_TIMESTAMP,
                     "type": "telegram",
                 }
 
-                # Store in Firestore
-                messages_ref = self.db_client.collection("messages")
-                messages_ref.add(message_data)
-
-                logger.info(
-                    f"💾 Stored encrypted message {message.message_id} to Firestore"
-                )
+                # Store in Firestore alongside any concurrent webhooks while
+                # the response is being sent
+                pending.append(self._write_batcher.submit((message_data, message.text)))
 
             # 2. Send response back to chat
             # Determine user display name
             user_display = user.username if user.username else user.first_name
 
             # Determine chat type and name
-            if chat.type == "private":
-                chat_display = "private chat"
-            else:
-                chat_display = chat.title or f"group chat {chat.id}"
+            chat_display = (
+                _CHAT_DISPLAY.get(chat.type) or chat.title or f"group chat {chat.id}"
+            )
 
             # Create response message
-            response_text = f"I received message from *{user_display}*, in the chat *{chat_display}*, message id #{message.message_id}"
-
-            # Send response back to the chat
-            await self.telegram_bot.send_message(
-                chat_id=chat.id, text=response_text, parse_mode="Markdown"
+            response_text = _RESPONSE_TEMPLATE(
+                user=user_display, chat=chat_display, mid=message.message_id
             )
 
-            logger.info(
-                f"📤 Sent response for message {message.message_id} in chat {chat.id}"
+            # Send response back to the chat, concurrently with the store
+            pending.append(
+                self.telegram_bot.send_message(
+                    chat_id=chat.id, text=response_text, parse_mode="Markdown"
+                )
             )
+            await asyncio.gather(*pending)
+
+            logger.info(f"📤 Handled message {message.message_id} in chat {chat.id}")
 
             return message.message_id
 
@@ -4,27 +4,49 @@ This module provides mock implementations that implement the same interfaces
 as production services but use in-memory storage and simple logic for testing.
 """
 
+from __future__ import annotations
+
+import functools
 import logging
+import sys
 import uuid
 from datetime import datetime
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
 from interfaces import (
     DatabaseClient,
-    DatabaseCollection,
-    DatabaseDocument,
-    DatabaseQuery,
     EncryptionService,
     FieldFilterFactory,
     MessageHandler,
+    SentMessageResult,
     TelegramBot,
-    TelegramUpdate,
     TelegramUpdateParser,
 )
 
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+    from interfaces import (
+        DatabaseCollection,
+        DatabaseDocument,
+        DatabaseDocumentReference,
+        DatabaseQuery,
+        TelegramUpdate,
+    )
+
 logger = logging.getLogger(__name__)
 
 
+def _server_timestamp() -> Any:
+    """Return Firestore's SERVER_TIMESTAMP sentinel, or None without the SDK.
+
+    Data can only hold the sentinel if its module was already imported, so
+    the test implementations never import the GCP SDK themselves.
+    """
+    firestore_v1 = sys.modules.get("google.cloud.firestore_v1")
+    return getattr(firestore_v1, "SERVER_TIMESTAMP", None)
+
+
 class TestDatabaseDocument:
     """Test database document implementation."""
 
@@ -40,17 +62,34 @@ class TestDatabaseDocument:
         return True
 
 
+class TestDatabaseDocumentReference:
+    """Test database document reference implementation."""
+
+    def __init__(self, doc_id: str, collection: TestDatabaseCollection):
+        self.id = doc_id
+        self._collection = collection
+
+    def get(self) -> DatabaseDocument:
+        docs = self._collection.test_client._collections.get(
+            self._collection.collection_name, []
+        )
+        for doc in docs:
+            if doc.id == self.id:
+                return doc
+        return TestDatabaseDocument(self.id, {})
+
+
 class TestDatabaseQuery:
     """Test database query implementation."""
 
-    def __init__(self, collection_name: str, test_client: "TestDatabaseClient"):
+    def __init__(self, collection_name: str, test_client: TestDatabaseClient):
         self.collection_name = collection_name
         self.test_client = test_client
         self._filters = []
         self._limit_value = None
         self._start_after_doc = None
 
-    def where(self, filter: Any = None, **kwargs) -> "TestDatabaseQuery":
+    def where(self, filter: Any = None, **kwargs) -> TestDatabaseQuery:
         new_query = TestDatabaseQuery(self.collection_name, self.test_client)
         new_query._filters = self._filters.copy()
         new_query._limit_value = self._limit_value
@@ -64,14 +103,14 @@ class TestDatabaseQuery:
 
         return new_query
 
-    def limit(self, count: int) -> "TestDatabaseQuery":
+    def limit(self, count: int) -> TestDatabaseQuery:
         new_query = TestDatabaseQuery(self.collection_name, self.test_client)
         new_query._filters = self._filters.copy()
         new_query._limit_value = count
         new_query._start_after_doc = self._start_after_doc
         return new_query
 
-    def start_after(self, document: DatabaseDocument) -> "TestDatabaseQuery":
+    def start_after(self, document: DatabaseDocument) -> TestDatabaseQuery:
         new_query = TestDatabaseQuery(self.collection_name, self.test_client)
         new_query._filters = self._filters.copy()
         new_query._limit_value = self._limit_value
@@ -112,7 +151,7 @@ class TestDatabaseQuery:
                 break
         return docs[start_index:]
 
-    def stream(self) -> list[DatabaseDocument]:
+    def stream(self) -> Iterator[DatabaseDocument]:
         """Stream documents with applied filters and pagination."""
         # Get all documents from the collection
         all_docs = self.test_client._collections.get(self.collection_name, [])
@@ -127,17 +166,25 @@ class TestDatabaseQuery:
         if self._limit_value:
             filtered_docs = filtered_docs[: self._limit_value]
 
-        return filtered_docs
+        return iter(filtered_docs)
 
 
 class TestDatabaseCollection:
     """Test database collection implementation."""
 
-    def __init__(self, collection_name: str, test_client: "TestDatabaseClient"):
+    def __init__(self, collection_name: str, test_client: TestDatabaseClient):
         self.collection_name = collection_name
         self.test_client = test_client
 
     def add(self, data: dict[str, Any]) -> tuple:
+        # Stamp server-timestamp sentinels client-side, as Firestore would
+        now = datetime.utcnow()
+        server_timestamp = _server_timestamp()
+        if server_timestamp is not None:
+            data = {
+                key: now if value is server_timestamp else value
+                for key, value in data.items()
+            }
         doc_id = str(uuid.uuid4())
         doc = TestDatabaseDocument(doc_id, data)
 
@@ -145,14 +192,19 @@ class TestDatabaseCollection:
             self.test_client._collections[self.collection_name] = []
 
         self.test_client._collections[self.collection_name].append(doc)
-        return (datetime.utcnow(), doc)
+        return (now, doc)
 
-    def document(self, doc_id: str) -> DatabaseDocument:
-        docs = self.test_client._collections.get(self.collection_name, [])
-        for doc in docs:
-            if doc.id == doc_id:
-                return doc
-        return TestDatabaseDocument(doc_id, {})
+    def batch_add(self, items: list[dict[str, Any]]) -> list[str]:
+        return [self.add(data)[1].id for data in items]
+
+    async def add_async(self, data: dict[str, Any]) -> tuple:
+        return self.add(data)
+
+    async def batch_add_async(self, items: list[dict[str, Any]]) -> list[str]:
+        return self.batch_add(items)
+
+    def document(self, doc_id: str) -> DatabaseDocumentReference:
+        return TestDatabaseDocumentReference(doc_id, self)
 
     def where(self, filter: Any = None, **kwargs) -> DatabaseQuery:
         query = TestDatabaseQuery(self.collection_name, self.test_client)
@@ -162,8 +214,49 @@ class TestDatabaseCollection:
         query = TestDatabaseQuery(self.collection_name, self.test_client)
         return query.limit(count)
 
-    def stream(self) -> list[DatabaseDocument]:
-        return self.test_client._collections.get(self.collection_name, [])
+    def stream(self) -> Iterator[DatabaseDocument]:
+        return iter(self.test_client._collections.get(self.collection_name, []))
+
+
+@functools.cache
+def _seed_documents() -> tuple[TestDatabaseDocument, ...]:
+    """Build the seeded messages once; stored documents are never mutated."""
+    messages_data = [
+        {
+            "message_id": 1,
+            "chat_id": -100123456789,
+            "chat_title": "Test Group",
+            "user_id": 123456,
+            "username": "testuser",
+            "encrypted_text": {
+                "ciphertext": "dGVzdCBtZXNzYWdlIDEK",  # base64 "test message 1"
+                "encrypted_data_key": "mock_key_1",
+                "iv": "mock_iv_1",
+                "salt": "mock_salt_1",
+            },
+            "timestamp": datetime.utcnow(),
+            "type": "telegram",
+        },
+        {
+            "message_id": 2,
+            "chat_id": -100123456789,
+            "chat_title": "Test Group",
+            "user_id": 789012,
+            "username": "testuser2",
+            "encrypted_text": {
+                "ciphertext": "dGVzdCBtZXNzYWdlIDIK",  # base64 "test message 2"
+                "encrypted_data_key": "mock_key_2",
+                "iv": "mock_iv_2",
+                "salt": "mock_salt_2",
+            },
+            "timestamp": datetime.utcnow(),
+            "type": "telegram",
+        },
+    ]
+
+    return tuple(
+        TestDatabaseDocument(f"msg_{i}", data) for i, data in enumerate(messages_data)
+    )
 
 
 class TestDatabaseClient(DatabaseClient):
@@ -178,46 +271,14 @@ class TestDatabaseClient(DatabaseClient):
     def collection(self, collection_name: str) -> DatabaseCollection:
         return TestDatabaseCollection(collection_name, self)
 
+    def reset(self):
+        """Drop everything written since creation and restore the seed data."""
+        self._collections = {}
+        self._seed_test_data()
+
     def _seed_test_data(self):
         """Add some test data for integration tests."""
-        messages_data = [
-            {
-                "message_id": 1,
-                "chat_id": -100123456789,
-                "chat_title": "Test Group",
-                "user_id": 123456,
-                "username": "testuser",
-                "encrypted_text": {
-                    "ciphertext": "dGVzdCBtZXNzYWdlIDEK",  # base64 "test message 1"
-                    "encrypted_data_key": "mock_key_1",
-                    "iv": "mock_iv_1",
-                    "salt": "mock_salt_1",
-                },
-                "timestamp": datetime.utcnow(),
-                "type": "telegram",
-            },
-            {
-                "message_id": 2,
-                "chat_id": -100123456789,
-                "chat_title": "Test Group",
-                "user_id": 789012,
-                "username": "testuser2",
-                "encrypted_text": {
-                    "ciphertext": "dGVzdCBtZXNzYWdlIDIK",  # base64 "test message 2"
-                    "encrypted_data_key": "mock_key_2",
-                    "iv": "mock_iv_2",
-                    "salt": "mock_salt_2",
-                },
-                "timestamp": datetime.utcnow(),
-                "type": "telegram",
-            },
-        ]
-
-        # Add test messages
-        self._collections["messages"] = [
-            TestDatabaseDocument(f"msg_{i}", data)
-            for i, data in enumerate(messages_data)
-        ]
+        self._collections["messages"] = list(_seed_documents())
 
 
 class TestFieldFilterFactory(FieldFilterFactory):
@@ -311,7 +372,7 @@ class TestTelegramBot(TelegramBot):
 
     async def send_message(
         self, chat_id: int, text: str, parse_mode: str | None = None
-    ) -> dict[str, Any]:
+    ) -> SentMessageResult:
         message = {
             "message_id": len(self.sent_messages) + 1000,
             "chat": {"id": chat_id},
@@ -320,7 +381,7 @@ class TestTelegramBot(TelegramBot):
         }
         self.sent_messages.append(message)
         logger.info(f"🧪 Test: Would send message to {chat_id}: {text}")
-        return message
+        return SentMessageResult(message_id=message["message_id"], chat_id=chat_id)
 
 
 class TestTelegramMessage:
@@ -330,8 +391,8 @@ class TestTelegramMessage:
         self,
         message_id: int,
         text: str,
-        chat: "TestTelegramChat",
-        user: "TestTelegramUser",
+        chat: TestTelegramChat,
+        user: TestTelegramUser,
     ):
         self.message_id = message_id
         self.text = text
@@ -4,50 +4,134 @@ This module contains essential Docker-based integration tests for the TelegramGr
 application, focusing on core functionality in a containerized environment.
 """
 
-import concurrent.futures
+import asyncio
+import json
 import os
+import statistics
 import time
 
+import httpx
 import pytest
-import requests
 
 # Environment configuration for Docker testing
 APP_URL = os.environ.get("APP_URL", "http://app:8080")
 
+# Per-probe timeout, so one stalled probe cannot eat the readiness budget
+READINESS_PROBE_TIMEOUT = 1.0
+
+# Skip the full readiness wait if a run this recent saw the app healthy
+READY_CACHE_KEY = "docker/ready"
+READY_CACHE_SECONDS = 30
+
+# Health checks kept in flight at once by the concurrency test
+CONCURRENT_REQUESTS = 50
+
+# Endpoints whose warm latency is checked, one test case each
+RESPONSE_TIME_ENDPOINTS = ("/healthz", "/messages")
+
+# Canonical request bodies, serialized once at import
+JSON_HEADERS = {"Content-Type": "application/json"}
+VALID_UPDATE_BYTES = json.dumps(
+    {
+        "update_id": 123456789,
+        "message": {
+            "message_id": 1,
+            "from": {
+                "id": 123456,
+                "first_name": "Test",
+                "last_name": "User",
+                "username": "testuser",
+            },
+            "chat": {
+                "id": -100123456789,
+                "title": "Test Group",
+                "type": "group",
+            },
+            "date": 1234567890,
+            "text": "Hello, this is a test message",
+        },
+    }
+).encode()
+NON_MESSAGE_UPDATE_BYTES = json.dumps(
+    {
+        "update_id": 123456790,
+        "callback_query": {
+            "id": "test",
+            "from": {"id": 123456, "first_name": "Test"},
+            "data": "test_data",
+        },
+    }
+).encode()
+MINIMAL_UPDATE_BYTES = json.dumps(
+    {"update_id": 123, "message": {"text": "test"}}
+).encode()
+BATCH_CHAT_BYTES = json.dumps({"chat_id": -100123456789, "batch_size": 50}).encode()
+BATCH_USER_BYTES = json.dumps({"user_id": 123456, "batch_size": 25}).encode()
+
 # Mark all tests in this file as docker tests
 pytestmark = pytest.mark.docker
 
 
-def wait_for_service(url, timeout=60, interval=2):
-    """Wait for a service to be available."""
-    start_time = time.time()
-    while time.time() - start_time < timeout:
+def wait_for_service(client, url, timeout=60, interval=0.25, initial_delay=0.05):
+    """Wait for a service to be available.
+
+    Polls with HEAD over the given keep-alive client, backing off
+    exponentially from ``initial_delay`` up to ``interval`` between attempts.
+    """
+    deadline = time.monotonic() + timeout
+    attempt = 0
+    while time.monotonic() < deadline:
         try:
-            response = requests.get(url, timeout=5)
-            if response.status_code == 200:
+            response = client.head(url, timeout=READINESS_PROBE_TIMEOUT)
+            if response.status_code == 405:
+                response = client.get(url, timeout=READINESS_PROBE_TIMEOUT)
+            if response.is_success:
                 return True
-        except requests.exceptions.RequestException:
-            time.sleep(interval)
+        except httpx.HTTPError:
+            pass
+        time.sleep(min(initial_delay * 2**attempt, interval))
+        attempt += 1
     return False
 
 
+@pytest.fixture(scope="session")
+def http():
+    """Share one keep-alive HTTP client across readiness polls and tests."""
+    limits = httpx.Limits(max_connections=16, max_keepalive_connections=8)
+    with httpx.Client(limits=limits) as client:
+        yield client
+
+
 @pytest.fixture(scope="session", autouse=True)
-def setup_docker_environment():
+def setup_docker_environment(pytestconfig, http):
     """Setup the Docker test environment."""
     print("🐳 Setting up Docker test environment")
     print(f"📍 App URL: {APP_URL}")
 
     # Wait for the application to be ready
     health_url = f"{APP_URL}/healthz"
-    print(f"⏳ Waiting for application to be ready at {health_url}...")
 
-    if not wait_for_service(health_url, timeout=120):
-        pytest.fail(f"Application at {APP_URL} did not become ready in time")
-
-    print("✅ Application is ready for testing!")
-
-
-@pytest.fixture
+    # A recent run already saw this app healthy; one quick probe is enough.
+    # Without the cache provider (-p no:cacheprovider) always wait in full
+    cache = getattr(pytestconfig, "cache", None)
+    last_ready = cache.get(READY_CACHE_KEY, {}) if cache is not None else {}
+    recently_ready = (
+        last_ready.get("app_url") == APP_URL
+        and time.time() - last_ready.get("ready_at", 0) < READY_CACHE_SECONDS
+    )
+    if recently_ready and wait_for_service(http, health_url, timeout=0.5):
+        print("✅ Application is still ready from a recent run!")
+    else:
+        print(f"⏳ Waiting for application to be ready at {health_url}...")
+        if not wait_for_service(http, health_url, timeout=120):
+            pytest.fail(f"Application at {APP_URL} did not become ready in time")
+        print("✅ Application is ready for testing!")
+
+    if cache is not None:
+        cache.set(READY_CACHE_KEY, {"app_url": APP_URL, "ready_at": time.time()})
+
+
+@pytest.fixture(scope="session")
 def api_client():
     """Create an API client for making requests to the Docker container."""
     return APP_URL
@@ -57,106 +141,74 @@ def api_client():
 class TestDockerCore:
     """Core functionality tests in Docker environment."""
 
-    def test_health_check(self, api_client):
+    def test_health_check(self, api_client, http):
         """Test the health check endpoint."""
-        response = requests.get(f"{api_client}/healthz", timeout=10)
+        response = http.get(f"{api_client}/healthz", timeout=10)
         assert response.status_code == 200
         assert response.json() == {"status": "ok"}
 
-    def test_webhook_endpoints(self, api_client):
+    @pytest.mark.parametrize(
+        ("secret", "body", "expected_status"),
+        [
+            pytest.param(
+                "wrong-secret",
+                MINIMAL_UPDATE_BYTES,
+                500,  # Updated to match current behavior
+                id="invalid-secret",
+            ),
+            pytest.param(
+                "test_webhook_secret_123", VALID_UPDATE_BYTES, 200, id="message"
+            ),
+            pytest.param(
+                "test_webhook_secret_123",
+                NON_MESSAGE_UPDATE_BYTES,
+                200,  # Non-message updates are ignored
+                id="non-message",
+            ),
+        ],
+    )
+    def test_webhook_endpoints(self, api_client, http, secret, body, expected_status):
         """Test webhook functionality."""
-        # Test invalid secret
-        response = requests.post(
-            f"{api_client}/webhook/wrong-secret",
-            json={"update_id": 123, "message": {"text": "test"}},
-            timeout=10,
-        )
-        assert response.status_code == 500  # Updated to match current behavior
-
-        # Test valid webhook with message
-        webhook_payload = {
-            "update_id": 123456789,
-            "message": {
-                "message_id": 1,
-                "from": {
-                    "id": 123456,
-                    "first_name": "Test",
-                    "last_name": "User",
-                    "username": "testuser",
-                },
-                "chat": {
-                    "id": -100123456789,
-                    "title": "Test Group",
-                    "type": "group",
-                },
-                "date": 1234567890,
-                "text": "Hello, this is a test message",
-            },
-        }
-
-        response = requests.post(
-            f"{api_client}/webhook/test_webhook_secret_123",
-            json=webhook_payload,
+        response = http.post(
+            f"{api_client}/webhook/{secret}",
+            content=body,
+            headers=JSON_HEADERS,
             timeout=10,
         )
-        assert response.status_code == 200
-        data = response.json()
-        assert data["status"] == "ok"
-
-        # Test webhook with non-message update (should be ignored)
-        non_message_payload = {
-            "update_id": 123456790,
-            "callback_query": {
-                "id": "test",
-                "from": {"id": 123456, "first_name": "Test"},
-                "data": "test_data",
-            },
-        }
-
-        response = requests.post(
-            f"{api_client}/webhook/test_webhook_secret_123",
-            json=non_message_payload,
-            timeout=10,
-        )
-        assert response.status_code == 200
-        data = response.json()
-        assert data["status"] == "ok"
-
-    def test_message_endpoints(self, api_client):
-        """Test message retrieval and batch processing endpoints."""
-        # Test GET /messages endpoint
-        response = requests.get(f"{api_client}/messages", timeout=10)
+        assert response.status_code == expected_status
+        if expected_status == 200:
+            assert response.json()["status"] == "ok"
+
+    @pytest.mark.parametrize(
+        "params",
+        [
+            pytest.param(None, id="all"),
+            pytest.param({"chat_id": "-100123456789", "limit": 10}, id="chat-filter"),
+            pytest.param({"user_id": "123456", "limit": 5}, id="user-filter"),
+        ],
+    )
+    def test_message_endpoints(self, api_client, http, params):
+        """Test message retrieval with and without filters."""
+        response = http.get(f"{api_client}/messages", params=params, timeout=10)
         assert response.status_code == 200
         data = response.json()
         assert "messages" in data
         assert "next_page_token" in data
         assert isinstance(data["messages"], list)
 
-        # Test GET /messages with filters
-        response = requests.get(
-            f"{api_client}/messages",
-            params={"chat_id": "-100123456789", "limit": 10},
-            timeout=10,
-        )
-        assert response.status_code == 200
-        data = response.json()
-        assert "messages" in data
-
-        # Test GET /messages with user filter
-        response = requests.get(
-            f"{api_client}/messages",
-            params={"user_id": "123456", "limit": 5},
-            timeout=10,
-        )
-        assert response.status_code == 200
-        data = response.json()
-        assert "messages" in data
-
-        # Test POST /messages/batch endpoint
-        batch_payload = {"chat_id": -100123456789, "batch_size": 50}
-        response = requests.post(
+    @pytest.mark.parametrize(
+        "body",
+        [
+            pytest.param(BATCH_CHAT_BYTES, id="chat"),
+            pytest.param(BATCH_USER_BYTES, id="user"),
+        ],
+    )
+    def test_batch_endpoints(self, api_client, http, body):
+        """Test batch message processing."""
+        response = http.post(
             f"{api_client}/messages/batch",
-            json=batch_payload,
+            content=body,
+            headers=JSON_HEADERS,
             timeout=10,
         )
         assert response.status_code == 200
@@ -166,68 +218,68 @@ class TestDockerCore:
         assert isinstance(data["messages"], list)
         assert isinstance(data["count"], int)
 
-        # Test batch processing with user filter
-        user_batch_payload = {"user_id": 123456, "batch_size": 25}
-        response = requests.post(
-            f"{api_client}/messages/batch",
-            json=user_batch_payload,
-            timeout=10,
-        )
-        assert response.status_code == 200
-        data = response.json()
-        assert "messages" in data
-        assert "count" in data
-
 
 @pytest.mark.docker
 class TestDockerReliability:
     """Test Docker environment reliability and performance."""
 
-    def test_concurrent_requests(self, api_client):
+    @pytest.mark.asyncio
+    async def test_concurrent_requests(self, api_client):
         """Test concurrent request handling."""
 
-        def wait_for_health_check():
-            """Wait for the service to become healthy."""
+        async def timed_health_check(client):
+            """Return whether a health check succeeded and how long it took."""
+            start_ns = time.perf_counter_ns()
             try:
-                response = requests.get(f"{api_client}/healthz", timeout=10)
-                return response.status_code == 200
-            except Exception:
-                return False
-
-        # Make 5 concurrent requests (lightweight test)
-        with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-            futures = [executor.submit(wait_for_health_check) for _ in range(5)]
-            results = [
-                future.result() for future in concurrent.futures.as_completed(futures)
-            ]
-
-        # All requests should succeed
-        success_rate = sum(results) / len(results)
-        assert success_rate >= 0.8
-
-    def test_error_handling(self, api_client):
+                response = await client.get("/healthz")
+                ok = response.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            return ok, time.perf_counter_ns() - start_ns
+
+        # Keep every request in flight at once on one event loop
+        async with httpx.AsyncClient(base_url=api_client, timeout=10) as client:
+            results = await asyncio.gather(
+                *(timed_health_check(client) for _ in range(CONCURRENT_REQUESTS))
+            )
+
+        # Nearly all requests should succeed, without long tail latency
+        success_rate = sum(ok for ok, _ in results) / len(results)
+        assert success_rate >= 0.95
+        p95_ns = statistics.quantiles([elapsed for _, elapsed in results], n=20)[-1]
+        assert p95_ns < 5_000_000_000
+
+    def test_error_handling(self, api_client, http):
         """Test error handling."""
         # Test 404 for invalid endpoint
-        response = requests.get(f"{api_client}/invalid-endpoint", timeout=10)
+        response = http.get(f"{api_client}/invalid-endpoint", timeout=10)
         assert response.status_code == 404
 
         # Test malformed JSON handling
-        response = requests.post(
+        response = http.post(
             f"{api_client}/messages/batch",
-            data="invalid json",
-            headers={"Content-Type": "application/json"},
+            content="invalid json",
+            headers=JSON_HEADERS,
             timeout=10,
         )
         assert response.status_code in [400, 500]
 
-    def test_response_times(self, api_client):
-        """Test response times are reasonable."""
-        start_time = time.time()
-        response = requests.get(f"{api_client}/healthz", timeout=10)
-        end_time = time.time()
+    @pytest.mark.parametrize("endpoint", RESPONSE_TIME_ENDPOINTS)
+    def test_response_times(self, api_client, http, endpoint):
+        """Test response times are reasonable once the service is warm."""
+        url = f"{api_client}{endpoint}"
 
-        assert response.status_code == 200
-        assert (end_time - start_time) < 5.0  # Should respond quickly
+        # Warm up the connection outside the timed region
+        assert http.get(url, timeout=10).status_code == 200
+
+        timings = []
+        for _ in range(5):
+            start_ns = time.perf_counter_ns()
+            response = http.get(url, timeout=10)
+            timings.append((time.perf_counter_ns() - start_ns) / 1e9)
+            assert response.status_code == 200
+
+        assert statistics.median(timings) < 1.0  # Should respond quickly
 
 
 if __name__ == "__main__":
@@ -0,0 +1,49 @@
+"""
+Shared fixtures for the unit tests.
+
+The Flask app and its test client are built once per session from the
+dependency-injected test container, instead of once per test.
+"""
+
+import sys
+from unittest.mock import Mock
+
+import pytest
+
+# Stub telegram once for the whole unit run; conftest is imported before
+# any test module, so their imports already see the stubs. setdefault keeps
+# any telegram module that is already loaded in place
+sys.modules.setdefault("telegram", Mock())
+sys.modules.setdefault("telegram.ext", Mock())
+sys.modules.setdefault("telegram.request", Mock())
+
+from main import create_app
+from src.core.service_container import (
+    get_service_container,
+    reset_service_container,
+)
+
+
+@pytest.fixture(scope="session")
+def app():
+    """Create the Flask app once with the test service container."""
+    # Reset service container to ensure clean state
+    reset_service_container()
+
+    # Create app with test environment (uses dependency injection)
+    app = create_app(environment="test")
+    app.config["TESTING"] = True
+    return app
+
+
+@pytest.fixture(scope="session")
+def client(app):
+    """Create a test client shared by every test in the session."""
+    with app.test_client() as client:
+        yield client
+
+
+@pytest.fixture
+def clean_state(app):
+    """Restore the shared container's seed data without rebuilding the app."""
+    get_service_container().reset_state()
@@ -5,119 +5,103 @@ Tests the encryption and decryption functionality using mocks for
 Google Cloud KMS to ensure fast, isolated unit testing.
 """
 
-import sys
-from unittest.mock import Mock, patch
+from types import SimpleNamespace
+from unittest.mock import patch
 
 import pytest
 
-# Mock telegram imports
-sys.modules["telegram"] = Mock()
-sys.modules["telegram.ext"] = Mock()
-
-# Mock Firestore and KMS clients before importing main
-with (
-    patch("google.cloud.firestore.Client") as mock_firestore,
-    patch("google.cloud.kms.KeyManagementServiceClient") as mock_kms,
-):
-    mock_firestore.return_value = Mock()
-    mock_kms.return_value = Mock()
-    from encryption import MessageEncryption
+# KMS clients are only created when MessageEncryption is instantiated, so
+# the import needs no patching; the fake_kms fixture covers construction
+from encryption import MessageEncryption
 
 # Mark all tests in this file as unit tests
 pytestmark = pytest.mark.unit
 
+_ENCRYPTED = {
+    "ciphertext": "encrypted",
+    "encrypted_data_key": "key",
+    "iv": "iv",
+    "salt": "salt",
+}
+
+
+class _FakeKMS:
+    """Plain stand-in for the KMS client that counts its round trips."""
+
+    def __init__(self):
+        self.encrypt_calls = 0
+        self.decrypt_calls = 0
+
+    def encrypt(self, *args, **kwargs):
+        self.encrypt_calls += 1
+        # Return a valid 32-byte key for AES-256
+        return SimpleNamespace(ciphertext=b"A" * 32)
+
+    def decrypt(self, *args, **kwargs):
+        self.decrypt_calls += 1
+        return SimpleNamespace(plaintext=b"A" * 32)
+
+
+@pytest.fixture(scope="module")
+def fake_kms():
+    """Build every encryption client in this module with the fake KMS."""
+    with patch("google.cloud.kms.KeyManagementServiceClient", _FakeKMS):
+        yield
+
 
 @pytest.fixture
-def encryption():
+def encryption(fake_kms):
     """Create a MessageEncryption instance for testing."""
-    with patch("google.cloud.kms.KeyManagementServiceClient") as mock_kms:
-        # Return a valid 32-byte key for AES-256
-        mock_kms.return_value.encrypt.return_value.ciphertext = b"A" * 32
-        mock_kms.return_value.decrypt.return_value.plaintext = b"A" * 32
-        enc = MessageEncryption(
-            project_id="test-project",
-            location_id="global",
-            key_ring_id="test-keyring",
-            key_id="test-key",
-        )
-        enc.kms_client = mock_kms.return_value
-        return enc
+    # Each instance gets its own fake, so call counts start at zero
+    return MessageEncryption(
+        project_id="test-project",
+        location_id="global",
+        key_ring_id="test-keyring",
+        key_id="test-key",
+    )
 
 
 def test_encrypt_message(encryption):
     """Test message encryption."""
-    with patch.object(
-        encryption,
-        "encrypt_message",
-        return_value={
-            "ciphertext": "encrypted",
-            "encrypted_data_key": "key",
-            "iv": "iv",
-            "salt": "salt",
-        },
-    ):
-        test_message = "Test message"
-        encrypted_data = encryption.encrypt_message(test_message)
-        assert isinstance(encrypted_data, dict)
-        assert "ciphertext" in encrypted_data
-        assert "encrypted_data_key" in encrypted_data
-        assert "iv" in encrypted_data
-        assert "salt" in encrypted_data
-        assert isinstance(encrypted_data["ciphertext"], str)
-        assert isinstance(encrypted_data["encrypted_data_key"], str)
+    encryption.encrypt_message = lambda _message: _ENCRYPTED
+    test_message = "Test message"
+    encrypted_data = encryption.encrypt_message(test_message)
+    assert isinstance(encrypted_data, dict)
+    assert "ciphertext" in encrypted_data
+    assert "encrypted_data_key" in encrypted_data
+    assert "iv" in encrypted_data
+    assert "salt" in encrypted_data
+    assert isinstance(encrypted_data["ciphertext"], str)
+    assert isinstance(encrypted_data["encrypted_data_key"], str)
 
 
 def test_decrypt_message(encryption):
     """Test message decryption."""
-    with (
-        patch.object(
-            encryption,
-            "encrypt_message",
-            return_value={
-                "ciphertext": "encrypted",
-                "encrypted_data_key": "key",
-                "iv": "iv",
-                "salt": "salt",
-            },
-        ),
-        patch.object(encryption, "decrypt_message", return_value="Test message"),
-    ):
-        test_message = "Test message"
-        encrypted_data = encryption.encrypt_message(test_message)
-        decrypted_message = encryption.decrypt_message(encrypted_data)
-        assert decrypted_message == test_message
+    encryption.encrypt_message = lambda _message: _ENCRYPTED
+    encryption.decrypt_message = lambda _encrypted_data: "Test message"
+    test_message = "Test message"
+    encrypted_data = encryption.encrypt_message(test_message)
+    decrypted_message = encryption.decrypt_message(encrypted_data)
+    assert decrypted_message == test_message
 
 
 def test_encryption_consistency(encryption):
     """Test that encryption is consistent for the same input."""
-    with (
-        patch.object(
-            encryption,
-            "encrypt_message",
-            side_effect=[
-                {
-                    "ciphertext": "encrypted1",
-                    "encrypted_data_key": "key1",
-                    "iv": "iv1",
-                    "salt": "salt1",
-                },
-                {
-                    "ciphertext": "encrypted2",
-                    "encrypted_data_key": "key2",
-                    "iv": "iv2",
-                    "salt": "salt2",
-                },
-            ],
-        ),
-        patch.object(encryption, "decrypt_message", return_value="Test message"),
-    ):
-        test_message = "Test message"
-        encrypted_data1 = encryption.encrypt_message(test_message)
-        encrypted_data2 = encryption.encrypt_message(test_message)
-        assert encrypted_data1 != encrypted_data2  # Different due to random IV
-        decrypted1 = encryption.decrypt_message(encrypted_data1)
-        decrypted2 = encryption.decrypt_message(encrypted_data2)
-        assert decrypted1 == decrypted2  # But both decrypt to same message
+    results = iter(
+        [
+            {**_ENCRYPTED, "ciphertext": "encrypted1", "iv": "iv1"},
+            {**_ENCRYPTED, "ciphertext": "encrypted2", "iv": "iv2"},
+        ]
+    )
+    encryption.encrypt_message = lambda _message: next(results)
+    encryption.decrypt_message = lambda _encrypted_data: "Test message"
+    test_message = "Test message"
+    encrypted_data1 = encryption.encrypt_message(test_message)
+    encrypted_data2 = encryption.encrypt_message(test_message)
+    assert encrypted_data1 != encrypted_data2  # Different due to random IV
+    decrypted1 = encryption.decrypt_message(encrypted_data1)
+    decrypted2 = encryption.decrypt_message(encrypted_data2)
+    assert decrypted1 == decrypted2  # But both decrypt to same message
 
 
 def test_encryption_error_handling(encryption):
@@ -136,14 +120,46 @@ def test_encryption_error_handling(encryption):
     assert result == "[Message encrypted with different key]"
 
 
-def test_kms_client_initialization():
+def test_data_key_is_reused_across_messages(encryption):
+    """Test that KMS wraps one data key for several messages."""
+    first = encryption.encrypt_message("first message")
+    second = encryption.encrypt_message("second message")
+    assert encryption.client.encrypt_calls == 1
+    assert first["encrypted_data_key"] == second["encrypted_data_key"]
+    assert first["iv"] != second["iv"]
+
+
+def test_data_key_rotates_after_ttl(encryption):
+    """Test that an expired data key is replaced with a new one."""
+    encryption.encrypt_message("first message")
+    encryption._data_key_expires_at = 0.0
+    encryption.encrypt_message("second message")
+    assert encryption.client.encrypt_calls == 2
+
+
+def test_decrypt_uses_cached_data_key(encryption):
+    """Test that decrypting skips KMS for a known wrapped data key."""
+    encrypted_data = encryption.encrypt_message("round trip")
+    assert encryption.decrypt_message(encrypted_data) == "round trip"
+    assert encryption.decrypt_message(encrypted_data) == "round trip"
+    assert encryption.client.decrypt_calls == 0
+
+
+def test_encrypt_messages_batch(encryption):
+    """Test that a batch shares one data key and decrypts message by message."""
+    messages = ["first message", "second message", "third message"]
+    encrypted = encryption.encrypt_messages(messages)
+    assert encryption.client.encrypt_calls == 1
+    assert len({data["iv"] for data in encrypted}) == len(messages)
+    assert [encryption.decrypt_message(data) for data in encrypted] == messages
+
+
+def test_kms_client_initialization(fake_kms):
     """Test KMS client initialization."""
-    with patch("google.cloud.kms.KeyManagementServiceClient") as mock_kms:
-        enc = MessageEncryption(
-            project_id="test-project",
-            location_id="global",
-            key_ring_id="test-keyring",
-            key_id="test-key",
-        )
-        enc.kms_client = mock_kms.return_value
-        assert enc.kms_client is not None
+    enc = MessageEncryption(
+        project_id="test-project",
+        location_id="global",
+        key_ring_id="test-keyring",
+        key_id="test-key",
+    )
+    assert isinstance(enc.client, _FakeKMS)
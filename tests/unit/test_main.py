@@ -6,60 +6,53 @@ webhook processing, and message handling using dependency injection for
 external dependencies.
 """
 
+import asyncio
+import concurrent.futures
 import json
-import sys
-from unittest.mock import Mock, patch
+import threading
+from unittest.mock import patch
 
 import pytest
 
-# Mark all tests in this file as unit tests
-pytestmark = pytest.mark.unit
+from main import _run_async, create_app
+from src.core.service_container import reset_service_container
 
-# Mock telegram imports before importing main
-sys.modules["telegram"] = Mock()
-sys.modules["telegram.ext"] = Mock()
+# Mark all tests in this file as unit tests, each starting from the seed data
+pytestmark = [pytest.mark.unit, pytest.mark.usefixtures("clean_state")]
 
-from main import create_app  # noqa: E402
-from src.core.service_container import reset_service_container  # noqa: E402
 
+# Telegram update posted to the webhook, encoded once for every test
+_MOCK_UPDATE = {
+    "update_id": 123456789,
+    "message": {
+        "message_id": 1,
+        "from": {
+            "id": 123456,
+            "first_name": "Test",
+            "last_name": "User",
+            "username": "testuser",
+        },
+        "chat": {
+            "id": -100123456789,
+            "title": "Test Group",
+            "type": "group",
+        },
+        "date": 1234567890,
+        "text": "Test message content",
+    },
+}
+_MOCK_UPDATE_BYTES = json.dumps(_MOCK_UPDATE).encode()
 
-@pytest.fixture
-def client():
-    """Create a test client for the Flask app using dependency injection."""
-    # Reset service container to ensure clean state
-    reset_service_container()
+# Webhook secret set for this module, and the path that accepts it
+_WEBHOOK_SECRET = "test-secret"
+_WEBHOOK_PATH = f"/webhook/{_WEBHOOK_SECRET}"
 
-    # Create app with test environment (uses dependency injection)
-    app = create_app(environment="test")
-    app.config["TESTING"] = True
 
-    with app.test_client() as client:
-        with app.app_context():
-            yield client
-
-
-@pytest.fixture
-def mock_telegram_update():
-    """Create a mock Telegram update object."""
-    return {
-        "update_id": 123456789,
-        "message": {
-            "message_id": 1,
-            "from": {
-                "id": 123456,
-                "first_name": "Test",
-                "last_name": "User",
-                "username": "testuser",
-            },
-            "chat": {
-                "id": -100123456789,
-                "title": "Test Group",
-                "type": "group",
-            },
-            "date": 1234567890,
-            "text": "Test message content",
-        },
-    }
+@pytest.fixture(scope="module", autouse=True)
+def webhook_secret():
+    """Set the webhook secret once for every test in this module."""
+    with patch.dict("os.environ", {"WEBHOOK_SECRET": _WEBHOOK_SECRET}):
+        yield
 
 
 def test_healthz_endpoint(client):
@@ -71,31 +64,30 @@ def test_healthz_endpoint(client):
 
 def test_webhook_invalid_method(client):
     """Test webhook endpoint with invalid HTTP method."""
-    response = client.get("/webhook/test-secret")
+    response = client.get(_WEBHOOK_PATH)
     assert response.status_code == 405  # Method Not Allowed
 
 
-def test_webhook_valid_request(client, mock_telegram_update):
+def test_webhook_valid_request(client):
     """Test webhook endpoint with valid request using dependency injection."""
-    with patch.dict("os.environ", {"WEBHOOK_SECRET": "test-secret"}):
-        response = client.post(
-            "/webhook/test-secret",
-            data=json.dumps(mock_telegram_update),
-            content_type="application/json",
-        )
-        assert response.status_code == 200
-        assert response.get_json() == {"status": "ok"}
+    response = client.post(
+        _WEBHOOK_PATH,
+        data=_MOCK_UPDATE_BYTES,
+        content_type="application/json",
+    )
+    assert response.status_code == 200
+    assert response.get_json() == {"status": "ok"}
 
 
-def test_webhook_invalid_secret(client, mock_telegram_update):
+def test_webhook_invalid_secret(client, monkeypatch):
     """Test webhook endpoint with invalid secret."""
-    with patch.dict("os.environ", {"WEBHOOK_SECRET": "correct-secret"}):
-        response = client.post(
-            "/webhook/wrong-secret",
-            data=json.dumps(mock_telegram_update),
-            content_type="application/json",
-        )
-        assert response.status_code == 500
+    monkeypatch.setenv("WEBHOOK_SECRET", "correct-secret")
+    response = client.post(
+        "/webhook/wrong-secret",
+        data=_MOCK_UPDATE_BYTES,
+        content_type="application/json",
+    )
+    assert response.status_code == 500
 
 
 def test_webhook_no_message_update(client):
@@ -108,44 +100,23 @@ def test_webhook_no_message_update(client):
         },
     }
 
-    with patch.dict("os.environ", {"WEBHOOK_SECRET": "test-secret"}):
-        response = client.post(
-            "/webhook/test-secret",
-            data=json.dumps(update_without_message),
-            content_type="application/json",
-        )
-        assert response.status_code == 200
-        assert response.get_json() == {"status": "ok"}
+    response = client.post(
+        _WEBHOOK_PATH,
+        data=json.dumps(update_without_message),
+        content_type="application/json",
+    )
+    assert response.status_code == 200
+    assert response.get_json() == {"status": "ok"}
 
 
 def test_webhook_malformed_json(client):
     """Test webhook endpoint with malformed JSON."""
-    with patch.dict("os.environ", {"WEBHOOK_SECRET": "test-secret"}):
-        response = client.post(
-            "/webhook/test-secret",
-            data="invalid json",
-            content_type="application/json",
-        )
-        assert response.status_code == 500
-
-
-def test_messages_endpoint(client):
-    """Test the messages retrieval endpoint using injected test services."""
-    response = client.get("/messages")
-    assert response.status_code == 200
-    data = response.get_json()
-    assert "messages" in data
-    assert "next_page_token" in data
-    assert isinstance(data["messages"], list)
-
-
-def test_messages_endpoint_with_filters(client):
-    """Test the messages endpoint with query filters."""
-    response = client.get("/messages?chat_id=-100123456789&user_id=123456&limit=10")
-    assert response.status_code == 200
-    data = response.get_json()
-    assert "messages" in data
-    assert isinstance(data["messages"], list)
+    response = client.post(
+        _WEBHOOK_PATH,
+        data="invalid json",
+        content_type="application/json",
+    )
+    assert response.status_code == 500
 
 
 def test_messages_batch_endpoint(client):
@@ -164,14 +135,36 @@ def test_messages_batch_endpoint(client):
     assert isinstance(data["messages"], list)
 
 
-def test_app_uses_dependency_injection():
-    """Test that the app correctly uses dependency injection without TESTING flags."""
-    # Reset service container
-    reset_service_container()
+def test_async_work_shares_one_event_loop():
+    """Test that coroutines from separate requests run on the same loop."""
+
+    async def current_loop():
+        return asyncio.get_running_loop()
+
+    first = _run_async(current_loop())
+    second = _run_async(current_loop())
+    assert first is second
+    assert first.is_running()
 
-    # Create test app
-    app = create_app(environment="test")
 
+def test_async_work_times_out_and_is_cancelled():
+    """Test that a stalled coroutine fails its caller and is cancelled."""
+    cancelled = threading.Event()
+
+    async def stall():
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    with pytest.raises(concurrent.futures.TimeoutError):
+        _run_async(stall(), timeout=0.05)
+    assert cancelled.wait(timeout=1)
+
+
+def test_app_uses_dependency_injection(app):
+    """Test that the app correctly uses dependency injection without TESTING flags."""
     # Verify the app was created successfully
     assert app is not None
     assert app.config is not None
@@ -184,6 +177,7 @@ def test_app_uses_dependency_injection():
         assert "/messages" in [r for r in routes if "<" not in r]
 
 
+@pytest.mark.slow
 def test_app_can_be_created_multiple_times():
     """Test that multiple app instances can be created with clean state."""
     # Reset and create first app
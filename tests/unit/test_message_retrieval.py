@@ -5,70 +5,34 @@ Tests the message retrieval endpoints and functionality using dependency injecti
 for database and encryption services to ensure fast, isolated testing.
 """
 
-import sys
-from unittest.mock import Mock
-
 import pytest
 
-# Mock telegram imports before importing main
-sys.modules["telegram"] = Mock()
-sys.modules["telegram.ext"] = Mock()
-
-from main import create_app  # noqa: E402
-from src.core.service_container import reset_service_container  # noqa: E402
-
-# Mark all tests in this file as unit tests
-pytestmark = pytest.mark.unit
-
-
-@pytest.fixture
-def client():
-    """Create a test client for the Flask app using dependency injection."""
-    # Reset service container to ensure clean state
-    reset_service_container()
-
-    # Create app with test environment (uses dependency injection)
-    app = create_app(environment="test")
-    app.config["TESTING"] = True
-
-    with app.test_client() as client:
-        with app.app_context():
-            yield client
-
-
-def test_get_messages_with_test_data(client):
-    """Test getting messages using injected test services with seeded data."""
-    response = client.get("/messages")
+# Mark all tests in this file as unit tests, each starting from the seed data
+pytestmark = [pytest.mark.unit, pytest.mark.usefixtures("clean_state")]
+
+
+@pytest.mark.parametrize(
+    "query_string",
+    [
+        pytest.param({}, id="all"),
+        pytest.param({"chat_id": "-100123456789"}, id="chat_id"),
+        pytest.param({"user_id": "123456"}, id="user_id"),
+        pytest.param({"limit": "5"}, id="limit"),
+        pytest.param(
+            {"chat_id": "-100123456789", "user_id": "123456", "limit": "10"},
+            id="combined",
+        ),
+    ],
+)
+def test_get_messages_with_filters(client, query_string):
+    """Test getting seeded messages with and without query filters."""
+    response = client.get("/messages", query_string=query_string)
     assert response.status_code == 200
     data = response.get_json()
     assert "messages" in data
     assert "next_page_token" in data
     assert isinstance(data["messages"], list)
 
-    # Should have seeded test data
-    assert len(data["messages"]) >= 0  # May have test data
-
-
-def test_get_messages_with_filters(client):
-    """Test getting messages with query filters."""
-    # Test with chat_id filter
-    response = client.get("/messages?chat_id=-100123456789")
-    assert response.status_code == 200
-    data = response.get_json()
-    assert "messages" in data
-
-    # Test with user_id filter
-    response = client.get("/messages?user_id=123456")
-    assert response.status_code == 200
-    data = response.get_json()
-    assert "messages" in data
-
-    # Test with limit
-    response = client.get("/messages?limit=5")
-    assert response.status_code == 200
-    data = response.get_json()
-    assert "messages" in data
-
 
 def test_get_messages_pagination(client):
     """Test message pagination functionality."""
@@ -110,19 +74,17 @@ def test_batch_messages_without_filters(client):
     assert "count" in data
 
 
-def test_messages_endpoint_error_handling(client):
-    """Test error handling in messages endpoint."""
-    # Test with invalid limit
-    response = client.get("/messages?limit=invalid")
-    assert response.status_code == 500  # Should handle ValueError gracefully
-
-
-def test_batch_endpoint_error_handling(client):
-    """Test error handling in batch endpoint."""
-    # Test with invalid JSON
-    response = client.post(
-        "/messages/batch", data="invalid json", content_type="application/json"
-    )
+@pytest.mark.parametrize(
+    ("method", "path", "body"),
+    [
+        pytest.param("get", "/messages?limit=invalid", None, id="invalid-limit"),
+        pytest.param("post", "/messages/batch", "invalid json", id="invalid-json"),
+    ],
+)
+def test_endpoint_error_handling(client, method, path, body):
+    """Test that invalid input to the message endpoints is handled gracefully."""
+    send = getattr(client, method)
+    response = send(path, data=body, content_type="application/json")
     assert response.status_code == 500
 
 
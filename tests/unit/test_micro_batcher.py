@@ -0,0 +1,100 @@
+"""
+Unit Tests for the Micro Batcher
+
+Tests that concurrent submissions are coalesced into batched flushes and
+that results and errors reach the right submitters.
+"""
+
+import asyncio
+
+import pytest
+
+from src.core.micro_batcher import MicroBatcher
+
+# Mark all tests in this file as unit tests
+pytestmark = pytest.mark.unit
+
+
+def test_single_submission_flushes_immediately():
+    """Test that an idle batcher flushes a lone item on its own."""
+    batches = []
+
+    async def flush(items):
+        batches.append(items)
+        return [item * 2 for item in items]
+
+    async def run():
+        return await MicroBatcher(flush).submit(21)
+
+    assert asyncio.run(run()) == 42
+    assert batches == [[21]]
+
+
+def test_concurrent_submissions_share_a_flush():
+    """Test that items submitted together are flushed as one batch."""
+    batches = []
+
+    async def flush(items):
+        batches.append(items)
+        await asyncio.sleep(0)
+        return [f"id-{item}" for item in items]
+
+    async def run():
+        batcher = MicroBatcher(flush)
+        return await asyncio.gather(*(batcher.submit(i) for i in range(5)))
+
+    assert asyncio.run(run()) == [f"id-{i}" for i in range(5)]
+    assert batches == [[0, 1, 2, 3, 4]]
+
+
+def test_batches_respect_max_batch():
+    """Test that queued items are split into batches of at most max_batch."""
+    batches = []
+
+    async def flush(items):
+        batches.append(items)
+        return items
+
+    async def run():
+        batcher = MicroBatcher(flush, max_batch=2)
+        return await asyncio.gather(*(batcher.submit(i) for i in range(5)))
+
+    assert asyncio.run(run()) == [0, 1, 2, 3, 4]
+    assert batches == [[0, 1], [2, 3], [4]]
+
+
+def test_flush_error_reaches_every_submitter():
+    """Test that a failed flush raises in each submitter of that batch."""
+
+    async def flush(items):
+        raise RuntimeError("write failed")
+
+    async def run():
+        batcher = MicroBatcher(flush)
+        return await asyncio.gather(
+            batcher.submit(1), batcher.submit(2), return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_cancelled_flush_releases_every_submitter():
+    """Test that cancelling the drainer fails queued and in-flight submitters."""
+    started = asyncio.Event()
+
+    async def flush(items):
+        started.set()
+        await asyncio.Event().wait()  # Never completes on its own
+
+    async def run():
+        batcher = MicroBatcher(flush)
+        first = asyncio.ensure_future(batcher.submit(1))
+        await started.wait()
+        second = asyncio.ensure_future(batcher.submit(2))
+        await asyncio.sleep(0)
+        batcher._drainer.cancel()
+        return await asyncio.gather(first, second, return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results)
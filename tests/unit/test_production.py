@@ -0,0 +1,282 @@
+"""
+Unit Tests for the Production Implementations
+
+Tests the Firestore write paths and the message handler of the production
+implementations against mocked GCP and Telegram objects, so no GCP project
+or bot token is needed.
+"""
+
+import asyncio
+import concurrent.futures
+import json
+import threading
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+from google.cloud import firestore
+
+from interfaces import SentMessageResult
+from src.core.service_container import get_service_container
+from src.implementations.production import (
+    ProductionDatabaseClient,
+    ProductionDatabaseCollection,
+    ProductionMessageHandler,
+)
+
+# Mark all tests in this file as unit tests
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture(scope="module")
+def executor():
+    """Provide a named executor so tests can see where writes ran."""
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=2, thread_name_prefix="firestore-test"
+    ) as executor:
+        yield executor
+
+
+@pytest.fixture
+def firestore_collection():
+    """Create a mocked Firestore collection whose new documents get ids."""
+    collection = Mock()
+    collection.document.side_effect = lambda: Mock(
+        id=f"doc-{collection.document.call_count}"
+    )
+    collection.add.return_value = ("write-time", Mock(id="added"))
+    return collection
+
+
+@pytest.fixture
+def collection(firestore_collection, executor):
+    """Wrap the mocked Firestore collection in the production wrapper."""
+    return ProductionDatabaseCollection(firestore_collection, executor)
+
+
+def test_batch_add_single_item_uses_add(collection, firestore_collection):
+    """Test that a one-document batch is a plain add() without a WriteBatch."""
+    # Firestore resolves the sentinel server-side, so it must pass through
+    data = {"message_id": 1, "timestamp": firestore.SERVER_TIMESTAMP}
+
+    assert collection.batch_add([data]) == ["added"]
+    firestore_collection.add.assert_called_once_with(data)
+    firestore_collection._client.batch.assert_not_called()
+
+
+def test_batch_add_commits_one_write_batch(collection, firestore_collection):
+    """Test that several documents are committed in a single WriteBatch."""
+    items = [{"message_id": i} for i in range(3)]
+
+    doc_ids = collection.batch_add(items)
+
+    assert doc_ids == ["doc-1", "doc-2", "doc-3"]
+    firestore_collection._client.batch.assert_called_once()
+    batch = firestore_collection._client.batch.return_value
+    assert [call.args[1] for call in batch.set.call_args_list] == items
+    batch.commit.assert_called_once()
+    firestore_collection.add.assert_not_called()
+
+
+def test_batch_add_splits_at_commit_limit(collection, firestore_collection):
+    """Test that batches over Firestore's 500-write limit use several commits."""
+    doc_ids = collection.batch_add([{"message_id": i} for i in range(501)])
+
+    assert len(doc_ids) == 501
+    assert firestore_collection._client.batch.call_count == 2
+    batch = firestore_collection._client.batch.return_value
+    assert batch.commit.call_count == 2
+
+
+def test_async_writes_run_on_the_executor(collection, firestore_collection):
+    """Test that the async wrappers do their blocking writes off the loop."""
+    threads = []
+
+    def record_thread(*args):
+        threads.append(threading.current_thread().name)
+        return ("write-time", Mock(id="added"))
+
+    firestore_collection.add.side_effect = record_thread
+    firestore_collection._client.batch.return_value.commit.side_effect = record_thread
+
+    async def run():
+        await collection.add_async({"message_id": 1})
+        await collection.batch_add_async([{"message_id": 2}, {"message_id": 3}])
+
+    asyncio.run(run())
+    assert len(threads) == 2
+    assert all(name.startswith("firestore-test") for name in threads)
+
+
+def test_client_pool_rotates_round_robin():
+    """Test that collections are taken from the pooled clients in turn."""
+    clients = [Mock(name="client-0"), Mock(name="client-1")]
+    with patch.object(firestore, "Client", side_effect=clients):
+        db_client = ProductionDatabaseClient(pool_size=2)
+
+    for _ in range(3):
+        db_client.collection("messages")
+
+    assert clients[0].collection.call_count == 2
+    assert clients[1].collection.call_count == 1
+
+
+def test_client_pool_rejects_size_below_one():
+    """Test that an empty client pool is refused up front."""
+    with (
+        patch.object(firestore, "Client") as client_class,
+        pytest.raises(ValueError, match="at least 1"),
+    ):
+        ProductionDatabaseClient(pool_size=0)
+    client_class.assert_not_called()
+
+
+def test_document_get_passes_through(collection, firestore_collection):
+    """Test the document(id).get() lookup used for pagination cursors."""
+    snapshot = Mock(id="cursor", exists=True)
+    snapshot.to_dict.return_value = {"message_id": 7}
+    firestore_collection.document = Mock()
+    firestore_collection.document.return_value.get.return_value = snapshot
+
+    doc = collection.document("cursor").get()
+
+    firestore_collection.document.assert_called_once_with("cursor")
+    assert doc.id == "cursor"
+    assert doc.exists
+    assert doc.to_dict() == {"message_id": 7}
+
+
+def _make_update(message_id, text="Hello"):
+    """Build a minimal Telegram update with the fields the handler reads."""
+    return SimpleNamespace(
+        message=SimpleNamespace(
+            message_id=message_id,
+            text=text,
+            chat=SimpleNamespace(id=-100123456789, title="Test Group", type="group"),
+            from_user=SimpleNamespace(
+                id=123456, username="testuser", first_name="Test"
+            ),
+        )
+    )
+
+
+@pytest.fixture
+def handler():
+    """Create a production handler wired to async database and bot doubles."""
+    messages = Mock()
+    messages.add_async = AsyncMock(return_value=("write-time", Mock(id="added")))
+    messages.batch_add_async = AsyncMock(
+        side_effect=lambda items: [f"doc-{i}" for i in range(len(items))]
+    )
+    db_client = Mock()
+    db_client.collection.return_value = messages
+
+    encryption_service = Mock()
+    encryption_service.encrypt_messages.side_effect = lambda texts: [
+        {"ciphertext": text} for text in texts
+    ]
+
+    telegram_bot = Mock()
+    telegram_bot.send_message = AsyncMock(
+        return_value=SentMessageResult(message_id=1000, chat_id=-100123456789)
+    )
+    return ProductionMessageHandler(db_client, encryption_service, telegram_bot)
+
+
+def test_handler_stores_and_replies_concurrently(handler):
+    """Test that the store and the reply are in flight at the same time."""
+    messages = handler.db_client.collection.return_value
+
+    async def run():
+        store_started = asyncio.Event()
+        send_started = asyncio.Event()
+
+        # Each side waits for the other, so running them in turn deadlocks
+        async def add_async(data):
+            store_started.set()
+            await send_started.wait()
+            return ("write-time", Mock(id="added"))
+
+        async def send_message(**kwargs):
+            send_started.set()
+            await store_started.wait()
+            return SentMessageResult(message_id=1000, chat_id=kwargs["chat_id"])
+
+        messages.add_async.side_effect = add_async
+        handler.telegram_bot.send_message.side_effect = send_message
+        return await asyncio.wait_for(handler.handle_message(_make_update(1)), 1)
+
+    assert asyncio.run(run()) == 1
+    stored = messages.add_async.call_args.args[0]
+    assert stored["timestamp"] is firestore.SERVER_TIMESTAMP
+    assert stored["encrypted_text"] == {"ciphertext": "Hello"}
+    handler.telegram_bot.send_message.assert_awaited_once()
+
+
+def test_handler_encrypts_once_per_flushed_batch(handler):
+    """Test that concurrent messages share one encryption call off the loop."""
+    threads = []
+    encrypt = handler.encryption_service.encrypt_messages.side_effect
+
+    def record_thread(texts):
+        threads.append(threading.current_thread())
+        return encrypt(texts)
+
+    handler.encryption_service.encrypt_messages.side_effect = record_thread
+
+    async def run():
+        updates = [_make_update(i, f"message {i}") for i in range(3)]
+        return await asyncio.gather(*(handler.handle_message(u) for u in updates))
+
+    assert asyncio.run(run()) == [0, 1, 2]
+    handler.encryption_service.encrypt_messages.assert_called_once_with(
+        ["message 0", "message 1", "message 2"]
+    )
+    assert threads
+    assert threading.main_thread() not in threads
+    messages = handler.db_client.collection.return_value
+    assert len(messages.batch_add_async.call_args.args[0]) == 3
+    messages.add_async.assert_not_called()
+
+
+def test_handler_store_failure_raises(handler):
+    """Test that a failed store fails the handler after the reply is sent."""
+    messages = handler.db_client.collection.return_value
+    messages.add_async.side_effect = RuntimeError("write failed")
+
+    with pytest.raises(RuntimeError, match="write failed"):
+        asyncio.run(handler.handle_message(_make_update(1)))
+    handler.telegram_bot.send_message.assert_awaited_once()
+
+
+@pytest.mark.parametrize(
+    ("store_error", "expected_status"),
+    [
+        pytest.param(None, 200, id="stored"),
+        pytest.param(RuntimeError("write failed"), 500, id="store-failed"),
+    ],
+)
+def test_webhook_reports_store_outcome(
+    client, handler, monkeypatch, store_error, expected_status
+):
+    """Test that the webhook answers 500 when the production store fails."""
+    messages = handler.db_client.collection.return_value
+    messages.add_async.side_effect = store_error
+    monkeypatch.setenv("WEBHOOK_SECRET", "test-secret")
+    monkeypatch.setattr(get_service_container(), "_message_handler", handler)
+
+    update = {
+        "update_id": 1,
+        "message": {
+            "message_id": 1,
+            "from": {"id": 123456, "first_name": "Test", "username": "testuser"},
+            "chat": {"id": -100123456789, "title": "Test Group", "type": "group"},
+            "text": "Hello",
+        },
+    }
+    response = client.post(
+        "/webhook/test-secret",
+        data=json.dumps(update),
+        content_type="application/json",
+    )
+    assert response.status_code == expected_status
@@ -0,0 +1,134 @@
+"""
+Unit Tests for the Service Container
+
+Tests the global service container lifecycle: creation, reuse, and reset.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pytest
+from google.cloud.firestore_v1 import SERVER_TIMESTAMP
+
+from src.core import service_container
+from src.core.service_container import (
+    get_service_container,
+    initialize_service_container,
+    reset_service_container,
+)
+
+# Mark all tests in this file as unit tests
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture(autouse=True)
+def clean_container():
+    """Start every test without a global container, then restore it."""
+    saved = (
+        service_container._service_container,
+        service_container._service_container_environment,
+    )
+    reset_service_container()
+    yield
+    (
+        service_container._service_container,
+        service_container._service_container_environment,
+    ) = saved
+
+
+def test_initialize_creates_test_container():
+    """Test that the test environment yields the test container."""
+    container = initialize_service_container("test")
+    assert isinstance(container, service_container.TestServiceContainer)
+    assert get_service_container() is container
+
+
+def test_initialize_reuses_container_for_same_environment():
+    """Test that re-initializing the active environment is a no-op."""
+    first = initialize_service_container("test")
+    second = initialize_service_container("test")
+    assert second is first
+
+
+def test_reset_forces_new_container():
+    """Test that resetting discards the cached container."""
+    first = initialize_service_container("test")
+    reset_service_container()
+    second = initialize_service_container("test")
+    assert second is not first
+
+
+def test_get_without_initialize_raises():
+    """Test that reading the container before initialization fails."""
+    with pytest.raises(RuntimeError):
+        get_service_container()
+
+
+def test_unknown_environment_raises():
+    """Test that an unknown environment is rejected."""
+    with pytest.raises(ValueError):
+        initialize_service_container("staging")
+
+
+def test_reset_state_restores_seed_data():
+    """Test that a state reset drops writes but keeps the same services."""
+    container = initialize_service_container("test")
+    db_client = container.get_database_client()
+    seeded = len(list(db_client.collection("messages").stream()))
+    db_client.collection("messages").add({"message_id": 99})
+
+    container.reset_state()
+
+    assert container.get_database_client() is db_client
+    assert len(list(db_client.collection("messages").stream())) == seeded
+
+
+def test_test_database_stamps_server_timestamp():
+    """Test that the in-memory database resolves Firestore's timestamp sentinel."""
+    db_client = initialize_service_container("test").get_database_client()
+
+    write_time, doc = db_client.collection("messages").add(
+        {"message_id": 99, "timestamp": SERVER_TIMESTAMP}
+    )
+
+    assert isinstance(doc.to_dict()["timestamp"], datetime)
+    assert doc.to_dict()["timestamp"] == write_time
+
+
+@pytest.mark.parametrize(
+    ("pool_size", "error"),
+    [
+        pytest.param("zero", "must be an integer", id="not-a-number"),
+        pytest.param("0", "must be at least 1", id="zero"),
+    ],
+)
+def test_production_rejects_invalid_pool_size(monkeypatch, pool_size, error):
+    """Test that a bad FIRESTORE_CLIENT_POOL_SIZE fails with a clear error."""
+    for name in ("GCP_PROJECT_ID", "TELEGRAM_TOKEN", "WEBHOOK_SECRET"):
+        monkeypatch.setenv(name, "test-value")
+    monkeypatch.setenv("FIRESTORE_CLIENT_POOL_SIZE", pool_size)
+
+    container = service_container.ProductionServiceContainer()
+    with pytest.raises(ValueError, match=error):
+        container.get_database_client()
+
+
+def test_concurrent_getters_build_one_service(monkeypatch):
+    """Test that request threads racing on a getter share one service."""
+    container = initialize_service_container("test")
+    created = []
+
+    class SlowDatabaseClient:
+        def __init__(self):
+            created.append(self)
+            time.sleep(0.01)  # Widen the window for a check-then-set race
+
+    monkeypatch.setattr(
+        container._implementations(), "TestDatabaseClient", SlowDatabaseClient
+    )
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        clients = list(pool.map(lambda _: container.get_database_client(), range(8)))
+
+    assert len(created) == 1
+    assert all(client is created[0] for client in clients)